@@ -1,48 +1,194 @@
 import json
+import os
 import re
+import threading
+
+from handle_registry import product_owner
 
 INPUT_PATH = "dump/transformed_shopify_products.json"
 OUTPUT_PATH = "dump/transformed_shopify_products_with_skus.json"
+SKU_INDEX_PATH = os.path.join("dump", "sku_index.json")
+SKU_INDEX_VERSION = 2
 
+IC_PATTERN = re.compile(r"^IC(\d+)$", re.IGNORECASE)
 
-def find_highest_ic_sku(products):
-    max_num = 0
-    ic_pattern = re.compile(r"^IC(\d+)$", re.IGNORECASE)
-    for product in products:
-        for variant in product.get("variants", []):
-            sku = variant.get("inventoryItem", {}).get("sku", "")
-            match = ic_pattern.match(sku)
-            if match:
-                num = int(match.group(1))
-                if num > max_num:
-                    max_num = num
-    return max_num
-
-
-def assign_ic_variant_skus(products, start_num):
-    next_num = start_num + 1
-    ic_pattern = re.compile(r"^IC(\d+)$", re.IGNORECASE)
-    for product in products:
+
+def variant_key(owner, variant):
+    """
+    Stable key of a variant: the PrestaShop product id and the combination id
+    from its prestashop.id_product_attribute metafield (see dump_products).
+
+    Returns:
+        str: The key, or None for variants exported without a combination id.
+    """
+    for metafield in variant.get("metafields") or []:
+        if (
+            metafield.get("namespace") == "prestashop"
+            and metafield.get("key") == "id_product_attribute"
+        ):
+            return f"{owner}:{metafield.get('value')}"
+    return None
+
+
+class SkuAllocator:
+    """
+    Hands out IC SKUs to variants without a SKU, backed by an on-disk index.
+
+    The index remembers the number issued per variant (see variant_key), so the
+    same PrestaShop combination gets the same IC number in every run. New
+    numbers continue above both the index and every IC SKU seen in the export.
+    """
+
+    def __init__(self, path: str = SKU_INDEX_PATH):
+        self.path = path
+        self.skus = {}
+        self.next_num = 1
+        self.assigned = 0
+        # Numbers issued by the index or used by existing SKUs
+        self._taken = set()
+        # Numbers used by existing SKUs of the export
+        self._observed = set()
+        # Keys handed out in this run; a repeated key must not share a SKU
+        self._used_keys = set()
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == 1:
+            # Version 1 keyed on option values, only the issued numbers carry over
+            print(f"Rebuilding the SKU keys of {self.path}")
+            data["skus"] = {}
+        elif data.get("version") != SKU_INDEX_VERSION:
+            raise ValueError(f"Unsupported SKU index version in {self.path}")
+        self.skus = data["skus"]
+        self.next_num = data["next_num"]
+        self._taken = set(self.skus.values())
+
+    def save(self):
+        """
+        Write the index atomically.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {
+                "version": SKU_INDEX_VERSION,
+                "next_num": self.next_num,
+                "skus": self.skus,
+            }
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(self.path + ".tmp", self.path)
+
+    def observe(self, sku):
+        """
+        Reserve an existing IC SKU, so it is never handed out again.
+        """
+        match = IC_PATTERN.match(sku or "")
+        if match:
+            num = int(match.group(1))
+            with self._lock:
+                self._taken.add(num)
+                self._observed.add(num)
+                if num >= self.next_num:
+                    self.next_num = num + 1
+
+    def allocate(self, key=None):
+        """
+        Return the IC number of a variant key, issuing a new one if it has none.
+        Variants without a key (unknown product id) get a new number every time.
+        """
+        with self._lock:
+            self.assigned += 1
+            if key in self._used_keys:
+                key = None
+            elif key is not None:
+                self._used_keys.add(key)
+                num = self.skus.get(key)
+                # A number that has since been used by an existing SKU is reissued
+                if num is not None and num not in self._observed:
+                    return num
+
+            while self.next_num in self._taken:
+                self.next_num += 1
+            num = self.next_num
+            self.next_num += 1
+            self._taken.add(num)
+            if key is not None:
+                self.skus[key] = num
+            return num
+
+    def _pending_variants(self, product):
+        """
+        Observe the SKUs of a product and return the variants that need one.
+        """
+        pending = []
         for variant in product.get("variants", []):
-            inv_item = variant.get("inventoryItem", {})
-            vsku = inv_item.get("sku", "")
+            vsku = variant.get("inventoryItem", {}).get("sku", "")
             # Only assign if missing or empty (not if already a non-empty SKU)
             if not vsku or not vsku.strip():
-                inv_item["sku"] = f"IC{next_num}"
-                variant["inventoryItem"] = inv_item
-                next_num += 1
-    return products
+                pending.append(variant)
+            else:
+                self.observe(vsku)
+        return pending
+
+    def _assign(self, owner, variant):
+        key = None if owner is None else variant_key(owner, variant)
+        inv_item = variant.get("inventoryItem", {})
+        inv_item["sku"] = f"IC{self.allocate(key)}"
+        variant["inventoryItem"] = inv_item
+
+    def assign_product(self, product):
+        """
+        Assign IC SKUs to the variants of a product that have no SKU.
+
+        Existing IC SKUs further down a stream are not known yet, so observe
+        the IC references in PrestaShop first when streaming.
+
+        Returns:
+            dict: The same product.
+        """
+        owner = product_owner(product)
+        for variant in self._pending_variants(product):
+            self._assign(owner, variant)
+        return product
+
+    def assign_products(self, products):
+        """
+        Assign IC SKUs to a whole export in one pass. New numbers are issued
+        after every existing IC SKU of the export has been seen.
+
+        Returns:
+            list: The same products.
+        """
+        pending = []
+        for product in products:
+            owner = product_owner(product)
+            pending.extend(
+                (owner, variant) for variant in self._pending_variants(product)
+            )
+        for owner, variant in pending:
+            self._assign(owner, variant)
+        return products
 
 
 def run_skus(path: str):
     with open(path, "r") as f:
         products = json.load(f)
 
-    highest_ic = find_highest_ic_sku(products)
-    products = assign_ic_variant_skus(products, highest_ic)
+    allocator = SkuAllocator()
+    products = allocator.assign_products(products)
+    allocator.save()
 
     with open(OUTPUT_PATH, "w") as f:
         json.dump(products, f, indent=2, ensure_ascii=False)
-    print(f"Variant SKUs assigned (no override). Output written to {OUTPUT_PATH}")
+    print(
+        f"{allocator.assigned} variant SKUs assigned (no override). "
+        f"Output written to {OUTPUT_PATH}"
+    )
 
     return OUTPUT_PATH
@@ -0,0 +1,198 @@
+import dataclasses
+import json
+import sys
+import time
+
+import shopify_types
+from shopify_encoder import dumps, encode
+from shopify_types import CompactMixin, ExcludeNullMixin
+
+
+def _samples():
+    """
+    An instance of every shopify_types dataclass with all optional fields set,
+    and one with all optional fields left at None.
+    """
+    money = shopify_types.MoneyV2(amount="10.00", currencyCode="DKK")
+    seo = shopify_types.SEO(description="Beskrivelse æøå", title="Titel")
+    metafield = shopify_types.ShopifyMetaField(
+        namespace="product_feature", key="medie", value='["Luft"]', type="json"
+    )
+    variant = shopify_types.CreateShopifyProductVariantInput(
+        barcode="5700000000000",
+        inventoryItem=shopify_types.InventoryItem(cost=money, sku="IC1", tracked=True),
+        inventoryPolicy="CONTINUE",
+        price=money,
+        inventoryQuantities=[
+            shopify_types.InventoryQuantity(
+                locationId="gid://1", name="available", quantity=3
+            )
+        ],
+        optionValues=[shopify_types.VariantOptionValue(name="Rød", optionName="Farve")],
+        metafields=[metafield],
+    )
+    # dump_products stores the cost price as a plain string
+    variant_with_str_cost = shopify_types.CreateShopifyProductVariantInput(
+        barcode="",
+        inventoryItem=shopify_types.InventoryItem(cost="3.0", sku="", tracked=True),
+        inventoryPolicy="CONTINUE",
+        price=money,
+        inventoryQuantities=[],
+        optionValues=[],
+    )
+    compact_variant = shopify_types.CreateShopifyProductVariantInput(
+        barcode="5700000000000",
+        inventoryItem=shopify_types.InventoryItem(cost=money, sku="IC2", tracked=True),
+        inventoryPolicy="CONTINUE",
+        price=money,
+        inventoryQuantities=[
+            shopify_types.CompactInventoryQuantity(
+                locationId="gid://1", name="available", quantity=3
+            )
+        ],
+        optionValues=[
+            shopify_types.CompactVariantOptionValue(name="Rød", optionName="Farve")
+        ],
+    )
+    compact_metafield = shopify_types.CompactShopifyMetaField(
+        namespace="prestashop", key="id", value="1", type="single_line_text_field"
+    )
+    option = shopify_types.ProductOptionValue(
+        name="Farve", values=[shopify_types.OptionValue(name="Rød")]
+    )
+    collection = shopify_types.CreateCollectionInput(
+        title="Kategori",
+        descriptionHtml="<p>Tekst</p>",
+        image=shopify_types.Image(src="https://example.com/1.jpg", alt="Alt"),
+        handle="kategori",
+        seo=seo,
+        metafields=[metafield],
+    )
+    brand = shopify_types.CreateBrandInput(
+        name="Brand",
+        handle=shopify_types.MetaobjectHandle(handle="brand", type="brand"),
+        description="Beskrivelse",
+        short_description="Kort",
+        meta_title="Titel",
+        meta_description="Meta",
+    )
+    media = shopify_types.CreateShopifyMediaPayload(
+        alt="Alt", mediaContentType="IMAGE", originalSource="https://example.com/1.jpg"
+    )
+    file = shopify_types.File(
+        contentType="IMAGE",
+        originalSource="https://example.com/1.jpg",
+        alt="Alt",
+        filename="1.jpg",
+    )
+    product = shopify_types.Product(
+        title="Titel",
+        descriptionHtml="<p>Tekst</p>",
+        handle="titel",
+        seo=seo,
+        status="ACTIVE",
+        productOptions=[option],
+    )
+    return [
+        money,
+        seo,
+        metafield,
+        variant,
+        option,
+        collection,
+        brand,
+        media,
+        file,
+        product,
+        shopify_types.Image(src="https://example.com/1.jpg"),
+        shopify_types.File(
+            contentType="IMAGE", originalSource="https://example.com/1.jpg"
+        ),
+        shopify_types.CreateCollectionInput(title="Kategori"),
+        shopify_types.CreateBrandInput(
+            name="Brand",
+            handle=shopify_types.MetaobjectHandle(handle="b", type="brand"),
+        ),
+        shopify_types.CreateShopifyProductInput(
+            product=product, media=[media], metafields=[metafield], variants=[variant]
+        ),
+        shopify_types.ProductSet(
+            title="Titel",
+            descriptionHtml="<p>Tekst</p>",
+            handle="titel",
+            seo=seo,
+            status="ACTIVE",
+            files=[file],
+            metafields=[metafield, compact_metafield],
+            variants=[variant, variant_with_str_cost, compact_variant],
+            vendor="Induclean",
+            id="gid://shopify/Product/1",
+            productOptions=[option],
+            collections=[collection],
+            brand=brand,
+        ),
+        shopify_types.ProductSet(
+            title="Titel",
+            descriptionHtml="",
+            handle="titel",
+            seo=seo,
+            status="DRAFT",
+            files=[],
+            metafields=[],
+            variants=[],
+        ),
+    ]
+
+
+def check_parity(rounds: int = 1000):
+    """
+    Check that encode() matches to_dict() for every shopify_types dataclass and
+    compare timings over the given number of rounds.
+    """
+    samples = _samples()
+    covered = set()
+    pending = list(samples)
+    while pending:
+        value = pending.pop()
+        if isinstance(value, list):
+            pending.extend(value)
+        elif dataclasses.is_dataclass(value):
+            covered.add(type(value))
+            pending.extend(
+                getattr(value, field.name) for field in dataclasses.fields(value)
+            )
+    for cls in vars(shopify_types).values():
+        if (
+            isinstance(cls, type)
+            and dataclasses.is_dataclass(cls)
+            and issubclass(cls, (ExcludeNullMixin, CompactMixin))
+        ):
+            assert cls in covered, f"no parity sample for {cls.__name__}"
+
+    for sample in samples:
+        expected = sample.to_dict()
+        assert (
+            encode(sample) == expected
+        ), f"{type(sample).__name__} differs from to_dict"
+        assert json.dumps(encode(sample)) == json.dumps(expected)
+        assert json.loads(dumps(sample)) == expected
+    print(f"{len(samples)} objects encoded identically to to_dict")
+
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        for sample in samples:
+            sample.to_dict()
+    to_dict_time = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        for sample in samples:
+            encode(sample)
+    encode_time = time.perf_counter() - started_at
+
+    print(f"to_dict: {to_dict_time:.3f}s")
+    print(f"encode:  {encode_time:.3f}s ({to_dict_time / encode_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    check_parity(*map(int, sys.argv[1:]))
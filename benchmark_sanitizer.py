@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+import html_sanitizer
+from html_sanitizer import _sanitize, sanitize_batch, sanitize_html
+from ps_services import as_list, get_categories, iter_product_pages
+
+
+def clean_html(html_content):
+    """
+    The original three-pass clean_html from dump_products.
+    """
+    if not html_content:
+        return ""
+
+    soup = BeautifulSoup(html_content, "html.parser")
+
+    # Remove all class attributes from p, span, and div tags
+    for tag in soup.find_all(["p", "span", "div"]):
+        del tag["class"]
+
+    # Remove all style attributes from p, span, and div tags
+    for tag in soup.find_all(["p", "span", "div"]):
+        del tag["style"]
+
+    # Remove all inline CSS
+    for style in soup.find_all("style"):
+        style.decompose()
+
+    return str(soup)
+
+
+def load_corpus(limit: int = None):
+    """
+    Collect the raw description HTML of products and categories from the
+    webservice (served from the response cache when fresh).
+
+    Args:
+        limit (int): Maximum number of products, None for the whole catalog.
+    """
+    corpus = []
+    for page in iter_product_pages(limit=limit):
+        for product in page:
+            corpus.append(product["description"]["language"]["value"])
+            try:
+                corpus.append(product["description_short"]["language"]["value"])
+            except KeyError:
+                pass
+
+    categories = get_categories(limit=9999)
+    if categories.get("categories"):
+        for category in as_list(categories["categories"]["category"]):
+            corpus.append(category["description"]["language"]["value"])
+    return [html_content for html_content in corpus if html_content]
+
+
+def benchmark(limit: int = None):
+    """
+    Check byte-identical output against the original clean_html and compare timings.
+    """
+    corpus = load_corpus(limit)
+    print(f"{len(corpus)} descriptions, {len(set(corpus))} unique")
+
+    started_at = time.perf_counter()
+    expected = [clean_html(html_content) for html_content in corpus]
+    reference_time = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    single_pass = [_sanitize(html_content) for html_content in corpus]
+    single_pass_time = time.perf_counter() - started_at
+
+    html_sanitizer._memo.clear()
+    started_at = time.perf_counter()
+    memoized = [sanitize_html(html_content) for html_content in corpus]
+    memoized_time = time.perf_counter() - started_at
+
+    html_sanitizer._memo.clear()
+    with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        started_at = time.perf_counter()
+        batched = sanitize_batch(corpus, executor)
+        batched_time = time.perf_counter() - started_at
+
+    assert single_pass == expected, "single pass output differs from clean_html"
+    assert memoized == expected, "memoized output differs from clean_html"
+    assert batched == expected, "batched output differs from clean_html"
+
+    print(f"clean_html:  {reference_time:.3f}s")
+    print(
+        f"single pass: {single_pass_time:.3f}s "
+        f"({reference_time / single_pass_time:.1f}x)"
+    )
+    print(f"memoized:    {memoized_time:.3f}s ({reference_time / memoized_time:.1f}x)")
+    print(f"batched:     {batched_time:.3f}s ({reference_time / batched_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    benchmark(*map(int, sys.argv[1:]))
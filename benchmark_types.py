@@ -0,0 +1,86 @@
+import gc
+import json
+import sys
+import tracemalloc
+
+from shopify_types import (
+    CompactInventoryQuantity,
+    CompactShopifyMetaField,
+    CompactVariantOptionValue,
+    InventoryQuantity,
+    ShopifyMetaField,
+    VariantOptionValue,
+)
+
+
+def _benchmark_product(index, metafield_cls, quantity_cls, option_value_cls):
+    """
+    Objects of one synthetic product, built from freshly decoded strings like
+    the webservice payloads.
+    """
+    payload = json.loads(
+        json.dumps(
+            {
+                "features": [[f"Feature {n}", f"Value {n % 3}"] for n in range(12)],
+                "id": str(index),
+                "location": "gid://shopify/Location/104422539566",
+                "options": [["Farve", f"Farve {n}"] for n in range(4)],
+            }
+        )
+    )
+    metafields = [
+        metafield_cls(
+            namespace="product_feature",
+            key=key,
+            value=value,
+            type="single_line_text_field",
+        )
+        for key, value in payload["features"]
+    ]
+    metafields.append(
+        metafield_cls(
+            namespace="prestashop",
+            key="id",
+            value=payload["id"],
+            type="single_line_text_field",
+        )
+    )
+    variants = [
+        (
+            [
+                quantity_cls(
+                    locationId=payload["location"], name="available", quantity=1
+                )
+            ],
+            [option_value_cls(name=value, optionName=name)],
+        )
+        for name, value in payload["options"]
+    ]
+    return metafields, variants
+
+
+def benchmark_memory(products: int = 10000):
+    """
+    Compare the memory held per product by the regular and compact classes.
+    """
+    variants = {
+        "regular": (ShopifyMetaField, InventoryQuantity, VariantOptionValue),
+        "compact": (
+            CompactShopifyMetaField,
+            CompactInventoryQuantity,
+            CompactVariantOptionValue,
+        ),
+    }
+    for name, classes in variants.items():
+        gc.collect()
+        tracemalloc.start()
+        built = [_benchmark_product(index, *classes) for index in range(products)]
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{name}: {size / products:.0f} bytes per product")
+        del built
+
+
+if __name__ == "__main__":
+    benchmark_memory(*map(int, sys.argv[1:]))
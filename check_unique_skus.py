@@ -1,39 +1,122 @@
+import argparse
 import json
+import os
+import tempfile
+import zlib
+from collections import defaultdict
 
-INPUT_PATH = "dump/transformed_shopify_products_with_skus.json"
+from handle_registry import product_handle
 
+INPUT_PATH = "dump/shopify_products.jsonl"
+# Number of partition files; each one is loaded on its own, which bounds memory
+PARTITIONS = 64
 
-def get_all_variant_skus(products):
-    skus = []
-    for product in products:
-        for variant in product.get("variants", []):
-            sku = variant.get("inventoryItem", {}).get("sku", "")
-            if sku:
-                skus.append(sku)
-    return skus
+CHECKS = ("sku", "barcode", "handle")
 
 
-def main():
-    with open(INPUT_PATH, "r") as f:
-        products = json.load(f)
+def iter_products(path):
+    """
+    Yield the products of a JSONL export one at a time.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line).get("input", {})
 
-    skus = get_all_variant_skus(products)
-    unique_skus = set(skus)
 
-    print(f"Total SKUs: {len(skus)}")
-    print(f"Unique SKUs: {len(unique_skus)}")
+def iter_values(product):
+    """
+    Yield (check, value) for the SKUs, barcodes and handle of a product.
+    """
+    handle = product_handle(product)
+    if handle:
+        yield "handle", handle
+    variants = (
+        product.get("variants") or product.get("product", {}).get("variants") or []
+    )
+    for variant in variants:
+        sku = (variant.get("inventoryItem") or {}).get("sku")
+        if sku:
+            yield "sku", sku
+        barcode = variant.get("barcode")
+        if barcode:
+            yield "barcode", barcode
 
-    if len(skus) == len(unique_skus):
-        print("✅ All variant SKUs are unique.")
-    else:
-        print("❌ Duplicate SKUs found!")
-        # Print duplicates
-        from collections import Counter
 
-        for sku, count in Counter(skus).items():
-            if count > 1:
-                print(f"{sku}: {count} times")
+def partition_values(path, directory, partitions: int = PARTITIONS):
+    """
+    Stream the export once and spread every value over partition files by hash,
+    so equal values always end up in the same file.
+
+    Returns:
+        dict: Number of values per check.
+    """
+    totals = dict.fromkeys(CHECKS, 0)
+    files = [
+        open(os.path.join(directory, f"{index}.jsonl"), "w", encoding="utf-8")
+        for index in range(partitions)
+    ]
+    try:
+        for product in iter_products(path):
+            handle = product_handle(product)
+            for check, value in iter_values(product):
+                totals[check] += 1
+                key = f"{check}:{value}".encode("utf-8")
+                files[zlib.crc32(key) % partitions].write(
+                    json.dumps([check, value, handle], ensure_ascii=False) + "\n"
+                )
+    finally:
+        for f in files:
+            f.close()
+    return totals
+
+
+def find_duplicates(directory, partitions: int = PARTITIONS):
+    """
+    Yield (check, value, handles) for every value that occurs more than once,
+    reading one partition at a time.
+    """
+    for index in range(partitions):
+        seen = defaultdict(list)
+        with open(
+            os.path.join(directory, f"{index}.jsonl"), "r", encoding="utf-8"
+        ) as f:
+            for line in f:
+                check, value, handle = json.loads(line)
+                seen[(check, value)].append(handle)
+        for (check, value), handles in seen.items():
+            if len(handles) > 1:
+                yield check, value, handles
+
+
+def main(path: str = INPUT_PATH, partitions: int = PARTITIONS):
+    duplicates = defaultdict(list)
+    with tempfile.TemporaryDirectory(prefix="check_unique_") as directory:
+        totals = partition_values(path, directory, partitions)
+        for check, value, handles in find_duplicates(directory, partitions):
+            duplicates[check].append((value, handles))
+
+    for check in CHECKS:
+        print(f"Total {check}s: {totals[check]}")
+
+    if not duplicates:
+        print("✅ All variant SKUs, barcodes and product handles are unique.")
+        return True
+
+    for check in CHECKS:
+        if duplicates[check]:
+            print(f"❌ Duplicate {check}s found!")
+            for value, handles in sorted(duplicates[check]):
+                handle_names = ", ".join(sorted({handle or "?" for handle in handles}))
+                print(f"{value}: {len(handles)} times ({handle_names})")
+    return False
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Check an export for duplicate SKUs, barcodes and handles"
+    )
+    parser.add_argument("path", nargs="?", default=INPUT_PATH)
+    parser.add_argument("--partitions", type=int, default=PARTITIONS)
+    args = parser.parse_args()
+    raise SystemExit(0 if main(args.path, args.partitions) else 1)
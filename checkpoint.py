@@ -0,0 +1,80 @@
+import json
+import os
+
+CHECKPOINT_PATH = os.path.join("dump", "checkpoint.jsonl")
+
+
+class Checkpoint:
+    """
+    Append-only journal of finished products, one JSON line per product.
+
+    Each line holds the PrestaShop id, the exported product (None if it was
+    skipped) and the handle it was given, so an interrupted export can be resumed.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH, resume: bool = False):
+        self.path = path
+        self.processed_ids = set()
+        # Handle per product id
+        self.handles = {}
+        self.count = 0
+
+        entries = self._read() if resume else []
+        for entry in entries:
+            self._remember(entry)
+
+        # Rewrite the journal with the valid entries only; a crash may have
+        # left a half written last line
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(path + ".tmp", path)
+
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        return entries
+
+    def _remember(self, entry):
+        self.processed_ids.add(entry["id"])
+        if entry["handle"] is not None:
+            self.handles[entry["id"]] = entry["handle"]
+        if entry["product"] is not None:
+            self.count += 1
+
+    def record(self, product_id, product, handle):
+        """
+        Append a finished product. product and handle are None for skipped products.
+        """
+        entry = {"id": str(product_id), "handle": handle, "product": product}
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        self._remember(entry)
+
+    def iter_products(self):
+        """
+        Yield the exported products in the order they were recorded.
+        """
+        self._file.flush()
+        for entry in self._read():
+            if entry["product"] is not None:
+                yield entry["product"]
+
+    def close(self):
+        self._file.close()
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
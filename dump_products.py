@@ -1,20 +1,49 @@
 import os
-import json
-import requests
-from bs4 import BeautifulSoup
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import current_process
 from ps_services import (
-    get_products,
-    get_product_option,
-    get_product_image,
-    get_product_option_values,
+    PRODUCTS_PAGE_SIZE,
+    iter_product_pages,
+    iter_products_by_ids,
+    get_product_images,
     get_combination,
-    get_feature,
-    get_feature_value,
-    get_manufacturer,
-    get_supplier_name,
+    get_combination_ids,
+    get_combinations,
+    as_list,
     get_category,
     get_stock,
+    get_stock_index,
 )
+from ps_catalog import (
+    cache_stats,
+    load_features,
+    load_attributes,
+    load_entities,
+    get_cached_manufacturer,
+    get_cached_supplier_name,
+    get_feature_name,
+    get_feature_value_name,
+    get_option_names,
+    print_cache_stats,
+)
+from ps_cache import response_cache
+from ps_throttle import throttle
+from ps_transport import api_session, print_connection_stats, storefront_session
+from json_writer import JsonArrayWriter
+from html_sanitizer import sanitize_batch, sanitize_html
+from checkpoint import Checkpoint
+from handle_registry import product_handle, registry
+from export_state import (
+    find_changed_products,
+    high_water_mark,
+    load_state,
+    save_state,
+)
+from url_resolver import category_url, product_url
+from ps_async import MAX_CONCURRENCY, enrich_products
+from shopify_encoder import encode
 
 from shopify_types import (
     CreateShopifyProductInput,
@@ -33,6 +62,9 @@ from shopify_types import (
     CreateBrandInput,
     MetaobjectHandle,
     InventoryQuantity,
+    CompactShopifyMetaField,
+    CompactInventoryQuantity,
+    CompactVariantOptionValue,
 )
 
 DEFAULT_OPTION_NAME = "Title"
@@ -42,6 +74,23 @@ LOCATION_ID_PRODUCTION = "gid://shopify/Location/104422539566"
 LOCATION_ID_DEVELOPMENT = "gid://shopify/Location/105528688972"
 LOCATION_ID = LOCATION_ID_PRODUCTION
 INVENTORY_NAME = "available"
+# Maximum number of products to export, None exports the whole catalog
+PRODUCT_LIMIT = 25
+CREATE_AS_SET = True
+# Number of concurrent webservice/storefront lookups while enriching a page
+CONCURRENCY = MAX_CONCURRENCY
+# Number of processes transforming products, 1 transforms in this process
+WORKERS = 1
+# Number of processes cleaning description HTML, 0 cleans in this process
+SANITIZE_PROCESSES = 0
+# Build metafields, inventory quantities and option values as slotted, frozen
+# objects with interned strings, which saves memory on large exports
+COMPACT_TYPES = True
+
+# Classes the export builds, chosen by COMPACT_TYPES
+MetaField = CompactShopifyMetaField if COMPACT_TYPES else ShopifyMetaField
+Quantity = CompactInventoryQuantity if COMPACT_TYPES else InventoryQuantity
+VariantOption = CompactVariantOptionValue if COMPACT_TYPES else VariantOptionValue
 
 
 # TODO For the ongoing sync i need to handle cases where they send new product features to prevent dublicates
@@ -51,67 +100,49 @@ INVENTORY_NAME = "available"
 
 
 def clean_html(html_content):
-    if not html_content:
-        return ""
-
-    soup = BeautifulSoup(html_content, "html.parser")
-
-    # Remove all class attributes from p, span, and div tags
-    for tag in soup.find_all(["p", "span", "div"]):
-        del tag["class"]
-
-    # Remove all style attributes from p, span, and div tags
-    for tag in soup.find_all(["p", "span", "div"]):
-        del tag["style"]
-
-    # Remove all inline CSS
-    for style in soup.find_all("style"):
-        style.decompose()
-
-    return str(soup)
+    return sanitize_html(html_content)
 
 
-used_handles = set()
-
-
-def ensure_unique_handle(handle):
+def warm_html_cache(page, sanitize_pool=None):
     """
-    Ensure the handle is unique by appending a small suffix if necessary.
+    Clean all product descriptions of a page in one batch, in sanitize_pool
+    when given.
     """
-    original_handle = handle
-    counter = 1
-    while handle in used_handles:
-        handle = f"{original_handle}-{counter}"
-        counter += 1
-    used_handles.add(handle)
-    return handle
+    html_contents = []
+    for product in page:
+        html_contents.append(product["description"]["language"]["value"])
+        try:
+            html_contents.append(product["description_short"]["language"]["value"])
+        except KeyError:
+            pass
+    sanitize_batch(html_contents, sanitize_pool)
 
 
 def create_shopify_collection_input(category):
     metafields = [
-        ShopifyMetaField(
+        MetaField(
             namespace="prestashop",
             key="id",
             value=str(category["id"]),
             type="single_line_text_field",
         ),
-        ShopifyMetaField(
+        MetaField(
             namespace="prestashop",
             key="position",
             value=str(category["position"]),
             type="single_line_text_field",
         ),
-        ShopifyMetaField(
+        MetaField(
             namespace="prestashop",
             key="url",
-            value=requests.get(f"https://induclean.dk/{category['id']}-random").url,
+            value=category_url(category),
             type="single_line_text_field",
         ),
     ]
 
     if category["id_parent"] not in CATEGORIES_TO_SKIP:
         metafields.append(
-            ShopifyMetaField(
+            MetaField(
                 namespace="prestashop",
                 key="parent_id",
                 value=str(category["id_parent"]),
@@ -143,6 +174,28 @@ def create_shopify_collection_input(category):
     )
 
 
+_collection_inputs = {}
+
+
+def get_collection_input(category_id, check_active=True):
+    """
+    Return the shared CreateCollectionInput for a category, built once per id.
+
+    Returns:
+        CreateCollectionInput: None if check_active is set and the category is not active.
+    """
+    category = get_category(category_id)["category"]
+    if check_active and not category.get("active", False):
+        return None
+
+    if category_id in _collection_inputs:
+        cache_stats["collections.hit"] += 1
+    else:
+        cache_stats["collections.miss"] += 1
+        _collection_inputs[category_id] = create_shopify_collection_input(category)
+    return _collection_inputs[category_id]
+
+
 def create_shopify_brand_input(manufacturer):
     return CreateBrandInput(
         name=manufacturer["manufacturer"]["name"],
@@ -160,22 +213,73 @@ def create_shopify_brand_input(manufacturer):
     )
 
 
+_brand_inputs = {}
+
+
+def get_brand_input(manufacturer_id):
+    """
+    Return the shared CreateBrandInput for a manufacturer, built once per id.
+    """
+    if manufacturer_id in _brand_inputs:
+        cache_stats["brands.hit"] += 1
+        return _brand_inputs[manufacturer_id]
+
+    cache_stats["brands.miss"] += 1
+    manufacturer_instance = get_cached_manufacturer(manufacturer_id)
+    brand_input = (
+        create_shopify_brand_input(manufacturer_instance)
+        if manufacturer_instance
+        else None
+    )
+    _brand_inputs[manufacturer_id] = brand_input
+    return brand_input
+
+
 def get_option_value(product_option_values_id: int):
-    option_value = get_product_option_values(product_option_values_id)
-    option_value_name = option_value["product_option_value"]["name"]["language"][
-        "value"
+    return get_option_names(product_option_values_id)
+
+
+def load_combinations(products):
+    """
+    Batch-fetch the combinations of one or more products into an id-indexed map.
+    """
+    combination_ids = [
+        combination_id
+        for product in products
+        for combination_id in get_combination_ids(product)
     ]
-    option = get_product_option(
-        option_value["product_option_value"]["id_attribute_group"]
+    return get_combinations(combination_ids)
+
+
+def load_stock(products):
+    """
+    Bulk-fetch stock for one or more products into a
+    (id_product, id_product_attribute) -> quantity index.
+    """
+    return get_stock_index([product["id"] for product in products])
+
+
+def combination_metafield(combination_id):
+    """
+    prestashop.id_product_attribute metafield of a variant, 0 for the single
+    variant of a product without combinations. add_skus keys the SKU index on it.
+    """
+    return MetaField(
+        namespace="prestashop",
+        key="id_product_attribute",
+        value=str(combination_id),
+        type="single_line_text_field",
     )
-    if option is None:
-        return None, None
-    option_name = option["product_option"]["name"]["language"]["value"]
-    return option_value_name, option_name
 
 
 def create_shopify_product_variant_input(
-    base_price, base_cost_price, combination_id, option_values, stock_availables
+    base_price,
+    base_cost_price,
+    combination_id,
+    option_values,
+    stock_availables,
+    combinations=None,
+    stock_index=None,
 ):
     # Normalize stock_availables to always be a list
     if isinstance(stock_availables, dict):
@@ -183,24 +287,33 @@ def create_shopify_product_variant_input(
     elif not isinstance(stock_availables, list):
         stock_availables = []
 
-    variant = get_combination(combination_id)
-    cost_price = float(variant["combination"]["wholesale_price"])
+    # Read from the preloaded combinations, fall back to a single request
+    if combinations is not None and str(combination_id) in combinations:
+        combination = combinations[str(combination_id)]
+    else:
+        combination = get_combination(combination_id)["combination"]
+    cost_price = float(combination["wholesale_price"])
     stock_quantity = 0
-    for stock in stock_availables:
-        if combination_id == stock["id_product_attribute"]:
-            stock_quantity = get_stock(stock["id"])
+    if stock_index is not None:
+        stock_quantity = stock_index.get(
+            (str(combination["id_product"]), str(combination_id)), 0
+        )
+    else:
+        for stock in stock_availables:
+            if combination_id == stock["id_product_attribute"]:
+                stock_quantity = get_stock(stock["id"])
     # Defaults to base cost price if cost price is not set
     if cost_price == 0.0:
         cost_price = base_cost_price
     variant_option_values = []
     if (
-        "associations" in variant["combination"]
-        and "product_option_values" in variant["combination"]["associations"]
+        "associations" in combination
+        and "product_option_values" in combination["associations"]
     ):
 
-        variants_payload = variant["combination"]["associations"][
-            "product_option_values"
-        ]["product_option_value"]
+        variants_payload = combination["associations"]["product_option_values"][
+            "product_option_value"
+        ]
         # Single option
         if isinstance(variants_payload, dict):
             option_value_id = variants_payload["id"]
@@ -208,7 +321,7 @@ def create_shopify_product_variant_input(
             if not all([option_value_name, option_name]):
                 return None, option_values
             variant_option_values.append(
-                VariantOptionValue(name=option_value_name, optionName=option_name)
+                VariantOption(name=option_value_name, optionName=option_name)
             )
             if option_name not in option_values:
                 option_values[option_name] = set()
@@ -219,34 +332,37 @@ def create_shopify_product_variant_input(
             for option_value in variants_payload:
                 option_value_name, option_name = get_option_value(option_value["id"])
                 variant_option_values.append(
-                    VariantOptionValue(name=option_value_name, optionName=option_name)
+                    VariantOption(name=option_value_name, optionName=option_name)
                 )
                 if option_name not in option_values:
                     option_values[option_name] = set()
                 option_values[option_name].add(option_value_name)
 
         variant_input = CreateShopifyProductVariantInput(
-            barcode=variant["combination"]["ean13"],
+            barcode=combination["ean13"],
             inventoryItem=InventoryItem(
                 cost=str(cost_price),  # Using wholesale price as cost price
-                sku=variant["combination"]["reference"],
+                sku=combination["reference"],
                 tracked=True,
             ),
             inventoryPolicy="CONTINUE",  # CONTINUE = Customers can buy this product variant after it's out of stock.
             optionValues=variant_option_values,
-            price=str(base_price + float(variant["combination"]["price"])),
+            price=str(base_price + float(combination["price"])),
             inventoryQuantities=[
-                InventoryQuantity(
+                Quantity(
                     locationId=LOCATION_ID, name=INVENTORY_NAME, quantity=stock_quantity
                 )
             ],
+            metafields=[combination_metafield(combination_id)],
         )
 
         return variant_input, option_values
     return None, option_values
 
 
-def create_shopify_product_input(product, as_set=False):
+def create_shopify_product_input(
+    product, as_set=False, combinations=None, stock_index=None, unique_handle=True
+):
     if product["id"] in PRODUCTS_TO_SKIP:
         print(f"Skipping product: {product['name']['language']['value']}")
         return None
@@ -267,15 +383,21 @@ def create_shopify_product_input(product, as_set=False):
 
     shopify_product = Product(
         title=product["name"]["language"]["value"],
-        descriptionHtml=short_description,
-        handle=ensure_unique_handle(product["link_rewrite"]["language"]["value"]),
+        descriptionHtml=clean_html(short_description),
+        handle=(
+            registry.allocate(
+                product["link_rewrite"]["language"]["value"], product["id"]
+            )
+            if unique_handle
+            else product["link_rewrite"]["language"]["value"]
+        ),
         seo=seo,
         status="ACTIVE",
         # vendor=get_manufacturer_name(product["id_manufacturer"]),
         productOptions=[],
     )
     # Image URLs
-    images = get_product_image(product["id"])
+    images = get_product_images(product)
 
     # Extract media payloads
     media = (
@@ -298,14 +420,10 @@ def create_shopify_product_input(product, as_set=False):
         if isinstance(features_payload, list):
             # Extract metafields
             metafields = [
-                ShopifyMetaField(
+                MetaField(
                     namespace="product_feature",
-                    key=get_feature(feature["id"])["product_feature"]["name"][
-                        "language"
-                    ]["value"],
-                    value=get_feature_value(feature["id_feature_value"])[
-                        "product_feature_value"
-                    ]["value"]["language"]["value"],
+                    key=get_feature_name(feature["id"]),
+                    value=get_feature_value_name(feature["id_feature_value"]),
                     type="single_line_text_field",
                 )
                 for feature in features_payload
@@ -314,20 +432,16 @@ def create_shopify_product_input(product, as_set=False):
         else:
             # Extract metafields
             metafields = [
-                ShopifyMetaField(
+                MetaField(
                     namespace="product_feature",
-                    key=get_feature(features_payload["id"])["product_feature"]["name"][
-                        "language"
-                    ]["value"],
-                    value=get_feature_value(features_payload["id_feature_value"])[
-                        "product_feature_value"
-                    ]["value"]["language"]["value"],
+                    key=get_feature_name(features_payload["id"]),
+                    value=get_feature_value_name(features_payload["id_feature_value"]),
                     type="single_line_text_field",
                 )
             ]
 
     # Add prestashop product to metadata
-    prestashop_product_id = ShopifyMetaField(
+    prestashop_product_id = MetaField(
         namespace="prestashop",
         key="id",
         value=product["id"],
@@ -339,7 +453,7 @@ def create_shopify_product_input(product, as_set=False):
     product_reference = product["reference"]
     if product_reference:
         # Add prestashop reference to metadata
-        prestashop_reference = ShopifyMetaField(
+        prestashop_reference = MetaField(
             namespace="prestashop",
             key="reference",
             value=product["reference"],
@@ -348,21 +462,18 @@ def create_shopify_product_input(product, as_set=False):
         metafields.append(prestashop_reference)
 
     # Add prestashop url to metadata
-    product_id = product["id"]
-    prestashop_url = ShopifyMetaField(
+    prestashop_url = MetaField(
         namespace="prestashop",
         key="url",
-        value=requests.get(
-            f"https://induclean.dk/random/{product_id}-random.html"
-        ).url,  # Ps will automatically redirect
+        value=product_url(product),
         type="single_line_text_field",
     )
     metafields.append(prestashop_url)
 
     # Add supplier to metadata
-    supplier_name = get_supplier_name(product["id_supplier"])
+    supplier_name = get_cached_supplier_name(product["id_supplier"])
     if supplier_name:
-        supplier = ShopifyMetaField(
+        supplier = MetaField(
             namespace="prestashop",
             key="supplier",
             value=supplier_name,
@@ -373,10 +484,10 @@ def create_shopify_product_input(product, as_set=False):
     # Add short_description to metadata
     description = product["description"]["language"]["value"]
     if description:
-        description = ShopifyMetaField(
+        description = MetaField(
             namespace="prestashop",
             key="description",
-            value=product["description"]["language"]["value"],
+            value=clean_html(description),
             type="multi_line_text_field",
         )
         metafields.append(description)
@@ -384,7 +495,7 @@ def create_shopify_product_input(product, as_set=False):
     # Add name_extra to metadata
     product_name_extra = product["name_extra"]["language"]["value"]
     if product_name_extra:
-        name_extra = ShopifyMetaField(
+        name_extra = MetaField(
             namespace="name_extra",
             key="name_extra",
             value=product["name_extra"]["language"]["value"],
@@ -404,6 +515,11 @@ def create_shopify_product_input(product, as_set=False):
         stock_availables = product["associations"]["stock_availables"][
             "stock_available"
         ]
+        # Fetch all combinations of the product at once unless preloaded for the page
+        if combinations is None:
+            combinations = load_combinations([product])
+        if stock_index is None:
+            stock_index = load_stock([product])
         if isinstance(combination_payload, dict):
             combination_id = combination_payload["id"]
             variant_input, _ = create_shopify_product_variant_input(
@@ -412,6 +528,8 @@ def create_shopify_product_input(product, as_set=False):
                 combination_id,
                 option_values,
                 stock_availables,
+                combinations,
+                stock_index,
             )
             if variant_input:
                 variants.append(variant_input)
@@ -423,11 +541,15 @@ def create_shopify_product_input(product, as_set=False):
                     combination["id"],
                     option_values,
                     stock_availables,
+                    combinations,
+                    stock_index,
                 )
                 if variant_input:
                     variants.append(variant_input)
     else:
-        if "stock_available" in product["associations"]["stock_availables"]:
+        if stock_index is not None:
+            stock = stock_index.get((str(product["id"]), "0"), 0)
+        elif "stock_available" in product["associations"]["stock_availables"]:
             stock_id = product["associations"]["stock_availables"]["stock_available"][
                 "id"
             ]
@@ -445,16 +567,15 @@ def create_shopify_product_input(product, as_set=False):
             inventoryPolicy="CONTINUE",
             price=str(base_price),
             inventoryQuantities=[
-                InventoryQuantity(
-                    locationId=LOCATION_ID, name=INVENTORY_NAME, quantity=stock
-                )
+                Quantity(locationId=LOCATION_ID, name=INVENTORY_NAME, quantity=stock)
             ],
             optionValues=[
-                VariantOptionValue(
+                VariantOption(
                     name=product["name"]["language"]["value"],
                     optionName=DEFAULT_OPTION_NAME,
                 )
             ],
+            metafields=[combination_metafield(0)],
         )
         variants.append(new_variant)
 
@@ -470,29 +591,19 @@ def create_shopify_product_input(product, as_set=False):
                 raise Exception("Failed to get category ID")
 
             if category_id not in CATEGORIES_TO_SKIP:
-                category_instance = get_category(category_id)
-
-                is_active = category_instance["category"].get("active", False)
-
-                if is_active:
-                    collection = create_shopify_collection_input(
-                        category_instance["category"]
-                    )
+                collection = get_collection_input(category_id)
+                if collection:
                     collections.append(collection)
     else:
         category_id = category_payload["id"]
         if category_id not in CATEGORIES_TO_SKIP:
-            category_instance = get_category(category_id)
-            collection = create_shopify_collection_input(category_instance["category"])
-            collections.append(collection)
+            collections.append(get_collection_input(category_id, check_active=False))
 
     # Handle brands
     shopify_brand_input = None
     manufacturer_id = product["id_manufacturer"]
     if manufacturer_id != "0":
-        manufacturer_instance = get_manufacturer(manufacturer_id)
-        if manufacturer_instance:
-            shopify_brand_input = create_shopify_brand_input(manufacturer_instance)
+        shopify_brand_input = get_brand_input(manufacturer_id)
 
     # Create product options
     product_options = [
@@ -543,35 +654,261 @@ def create_shopify_product_input(product, as_set=False):
     )
 
 
-def dump_products():
-    products = get_products(id=None, limit=25, random_sample=False)
-    CREATE_AS_SET = True
-    if "products" in products:
-        if isinstance(products["products"]["product"], list):
-            shopify_products = [
-                create_shopify_product_input(product, CREATE_AS_SET)
-                for product in products["products"]["product"]
-            ]
-        else:
-            shopify_products = [
-                create_shopify_product_input(
-                    products["products"]["product"], CREATE_AS_SET
-                )
-            ]
-    else:
-        shopify_products = [
-            create_shopify_product_input(products["product"], CREATE_AS_SET)
-        ]
+def _init_transform_worker():
+    """
+    Runs once in every transform process. Connections inherited from the
+    parent are not shared with it.
+    """
+    response_cache.detach()
+    api_session.close()
+    storefront_session.close()
+
+
+def _transform_product(product, combinations, stock_index):
+    """
+    Transform a product in a worker process, leaving the handle to the parent.
+
+    Returns:
+        tuple: The encoded Shopify product (or None for skipped products), the
+            name of the worker and the seconds it took.
+    """
+    started_at = time.perf_counter()
+    shopify_product = create_shopify_product_input(
+        product, CREATE_AS_SET, combinations, stock_index, unique_handle=False
+    )
+    shopify_product_dict = None if shopify_product is None else encode(shopify_product)
+    return (
+        shopify_product_dict,
+        current_process().name,
+        time.perf_counter() - started_at,
+    )
+
+
+def _product_lookups(product, combinations, stock_index):
+    """
+    The combinations and stock of one product, which is all of the page data
+    a worker process needs.
+    """
+    if combinations is not None:
+        combination_ids = {str(id) for id in get_combination_ids(product)}
+        combinations = {
+            id: combinations[id] for id in combination_ids if id in combinations
+        }
+    if stock_index is not None:
+        stock_index = {
+            key: quantity
+            for key, quantity in stock_index.items()
+            if key[0] == str(product["id"])
+        }
+    return combinations, stock_index
+
+
+def transform_page(page, combinations, stock_index, transform_pool, worker_stats):
+    """
+    Transform a page of products, in transform_pool when given. Handles are
+    assigned here in source order, so suffixes match a sequential run.
+
+    Yields:
+        tuple: The product and its encoded Shopify product (or None for skipped
+            products), in source order and as soon as each one is done.
+    """
+    if transform_pool is None:
+        for product in page:
+            shopify_product = create_shopify_product_input(
+                product, CREATE_AS_SET, combinations, stock_index
+            )
+            yield product, None if shopify_product is None else encode(shopify_product)
+        return
+
+    lookups = [_product_lookups(product, combinations, stock_index) for product in page]
+    results = transform_pool.map(
+        _transform_product,
+        page,
+        [product_combinations for product_combinations, _ in lookups],
+        [product_stock for _, product_stock in lookups],
+    )
+    for product, (shopify_product_dict, worker, seconds) in zip(page, results):
+        worker_stats[worker]["products"] += 1
+        worker_stats[worker]["seconds"] += seconds
+        if shopify_product_dict is not None:
+            product_input = shopify_product_dict.get("product", shopify_product_dict)
+            product_input["handle"] = registry.allocate(
+                product_input["handle"], product["id"]
+            )
+        yield product, shopify_product_dict
+
+
+def print_worker_stats(worker_stats):
+    for worker, stats in sorted(worker_stats.items()):
+        rate = stats["products"] / stats["seconds"] * 60 if stats["seconds"] else 0
+        print(f"{worker}: {stats['products']} products ({rate:.0f} products/min)")
+
+
+def get_changed_product_pages(page_size: int = PRODUCTS_PAGE_SIZE):
+    """
+    Pages of products changed since the last incremental export, and the
+    export state to save once they have been exported.
+    """
+    # Products, combinations and stock must be fresh to detect changes
+    for resource in ["products", "combinations", "stock_availables"]:
+        response_cache.clear(resource)
+
+    state = load_state()
+    changed_ids, new_state = find_changed_products(state, high_water_mark(state))
+    if changed_ids is None:
+        print("No previous export state found, exporting the whole catalog")
+        return iter_product_pages(page_size=page_size), new_state
+
+    print(f"{len(changed_ids)} products changed since {state['last_run']}")
+    return iter_products_by_ids(changed_ids, page_size), new_state
+
+
+def iter_shopify_products(
+    limit: int = PRODUCT_LIMIT,
+    page_size: int = PRODUCTS_PAGE_SIZE,
+    incremental: bool = False,
+    resume: bool = False,
+):
+    """
+    Fetch and transform products, yielding each Shopify product as a dict in
+    source order.
+
+    Every finished product is appended to dump/checkpoint.jsonl before it is
+    yielded. When resuming, the products already in the checkpoint are yielded
+    first.
+
+    Args:
+        limit (int): Maximum number of products, None for the whole catalog.
+            Ignored in incremental mode.
+        page_size (int): Number of products fetched per request.
+        incremental (bool): Only export products changed since the last
+            incremental export (date_upd, stock or combinations).
+        resume (bool): Continue an interrupted export, skipping the products
+            already in the checkpoint.
+    """
+    # Reference data shared by all products
+    load_features()
+    load_attributes()
+    load_entities()
 
     if not os.path.exists("dump"):
         os.makedirs("dump")
 
-    # Save the Shopify product inputs as JSON
-    with open(os.path.join("dump", "shopify_products.json"), "w") as f:
-        json.dump(
-            [product.to_dict() for product in shopify_products if product is not None],
-            f,
-            indent=2,
+    if incremental:
+        pages, new_state = get_changed_product_pages(page_size)
+    else:
+        pages = iter_product_pages(page_size=page_size, limit=limit)
+
+    checkpoint = Checkpoint(resume=resume)
+    if resume:
+        # Restore the handles so suffixes continue as in an uninterrupted run
+        for product_id, handle in checkpoint.handles.items():
+            registry.add(handle, product_id)
+        print(f"Resuming after {len(checkpoint.processed_ids)} processed products")
+
+    started_at = time.perf_counter()
+    count = 0
+    worker_stats = defaultdict(lambda: {"products": 0, "seconds": 0.0})
+    # One pool each for the whole export, starting processes per page costs
+    # more than it saves
+    transform_pool = (
+        ProcessPoolExecutor(max_workers=WORKERS, initializer=_init_transform_worker)
+        if WORKERS > 1
+        else None
+    )
+    sanitize_pool = (
+        ProcessPoolExecutor(max_workers=SANITIZE_PROCESSES)
+        if SANITIZE_PROCESSES > 1 and transform_pool is None
+        else None
+    )
+
+    try:
+        for shopify_product in checkpoint.iter_products():
+            count += 1
+            yield shopify_product
+
+        # Stream pages of products and journal each finished product
+        for page in pages:
+            page = [
+                product
+                for product in page
+                if product["id"] not in checkpoint.processed_ids
+            ]
+            if not page:
+                continue
+            # Fetch combinations, stock and all other lookups of the page concurrently
+            combinations, stock_index = enrich_products(
+                [product for product in page if product["id"] not in PRODUCTS_TO_SKIP],
+                CATEGORIES_TO_SKIP,
+                concurrency=CONCURRENCY,
+            )
+            # Transform processes clean their own descriptions
+            if transform_pool is None:
+                warm_html_cache(page, sanitize_pool)
+            for product, shopify_product_dict in transform_page(
+                page, combinations, stock_index, transform_pool, worker_stats
+            ):
+                if shopify_product_dict is None:
+                    checkpoint.record(product["id"], None, None)
+                    continue
+                checkpoint.record(
+                    product["id"],
+                    shopify_product_dict,
+                    product_handle(shopify_product_dict),
+                )
+                count += 1
+                yield shopify_product_dict
+    except BaseException:
+        checkpoint.close()
+        print(
+            f"Export interrupted after {len(checkpoint.processed_ids)} products, "
+            "run again with --resume to continue"
         )
+        raise
+    finally:
+        if transform_pool is not None:
+            transform_pool.shutdown()
+        if sanitize_pool is not None:
+            sanitize_pool.shutdown()
+
+    checkpoint.remove()
+    registry.save()
+
+    # Only move the high-water mark once everything has been exported
+    if incremental:
+        save_state(new_state)
+
+    elapsed = time.perf_counter() - started_at
+    print(
+        f"Exported {count} products in {elapsed:.1f}s "
+        f"({count / elapsed * 60 if elapsed else 0:.0f} products/min, "
+        f"concurrency {CONCURRENCY}, workers {WORKERS})"
+    )
+    print_worker_stats(worker_stats)
+    print_cache_stats()
+    response_cache.print_stats()
+    throttle.print_stats()
+    print_connection_stats()
+
+
+def dump_products(
+    limit: int = PRODUCT_LIMIT,
+    page_size: int = PRODUCTS_PAGE_SIZE,
+    incremental: bool = False,
+    resume: bool = False,
+):
+    """
+    Export products to dump/shopify_products.json, see iter_shopify_products.
+    """
+    path = os.path.join("dump", "shopify_products.json")
+    os.makedirs("dump", exist_ok=True)
+
+    # Write to a temporary file so an interrupted run never leaves a partial export
+    with JsonArrayWriter(path + ".tmp") as writer:
+        for shopify_product in iter_shopify_products(
+            limit, page_size, incremental, resume
+        ):
+            writer.write(shopify_product)
+    os.replace(path + ".tmp", path)
 
     return "dump/shopify_products.json"
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+
+from ps_services import (
+    as_list,
+    get_latest_product_update,
+    get_updated_product_ids,
+    list_combinations,
+    list_stock_availables,
+)
+
+STATE_PATH = os.path.join("dump", "export_state.json")
+
+
+def load_state(path: str = STATE_PATH):
+    """
+    Load the state of the last export: the high-water mark and the stock and
+    combination fingerprints per product.
+    """
+    if not os.path.exists(path):
+        return {"last_run": None, "stock": {}, "combinations": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(state, path: str = STATE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so a crash never leaves a half written state
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def high_water_mark(state):
+    """
+    High-water mark of this run: the latest date_upd in PrestaShop. It is read
+    from the shop instead of this machine's clock, since PrestaShop stores
+    date_upd in the shop's timezone. The date_upd filter is inclusive, so
+    products updated within that same second are exported again next time.
+    """
+    return get_latest_product_update() or state.get("last_run")
+
+
+def _fingerprints(rows, fields):
+    """
+    Hash the given fields of all rows per id_product.
+    """
+    rows_per_product = defaultdict(list)
+    for row in rows:
+        rows_per_product[str(row["id_product"])].append(
+            [str(row.get(field, "")) for field in fields]
+        )
+    return {
+        product_id: hashlib.sha1(
+            json.dumps(sorted(product_rows)).encode("utf-8")
+        ).hexdigest()
+        for product_id, product_rows in rows_per_product.items()
+    }
+
+
+def stock_fingerprints():
+    response = list_stock_availables()
+    rows = (
+        as_list(response["stock_availables"]["stock_available"])
+        if response.get("stock_availables")
+        else []
+    )
+    return _fingerprints(rows, ["id_product_attribute", "quantity"])
+
+
+def combination_fingerprints():
+    # PrestaShop does not track date_upd for combinations, so compare their content
+    response = list_combinations()
+    rows = (
+        as_list(response["combinations"]["combination"])
+        if response.get("combinations")
+        else []
+    )
+    return _fingerprints(rows, ["id", "price", "wholesale_price", "reference", "ean13"])
+
+
+def _changed(previous, current):
+    return {
+        product_id
+        for product_id in set(previous) | set(current)
+        if previous.get(product_id) != current.get(product_id)
+    }
+
+
+def find_changed_products(state, until: str):
+    """
+    Find products changed since the last export.
+
+    Returns:
+        tuple: (sorted product ids, new state to save once the export succeeded).
+            The ids are None if there is no previous export to compare against.
+    """
+    stock = stock_fingerprints()
+    combinations = combination_fingerprints()
+    new_state = {"last_run": until, "stock": stock, "combinations": combinations}
+
+    if not state.get("last_run"):
+        return None, new_state
+
+    changed_ids = set(get_updated_product_ids(state["last_run"], until))
+    changed_ids |= _changed(state.get("stock", {}), stock)
+    changed_ids |= _changed(state.get("combinations", {}), combinations)
+
+    return sorted(changed_ids, key=int), new_state
@@ -1,49 +1,25 @@
 import os
 import json
+import threading
 from slugify import slugify
 from shopify_types import ShopifyMetaField
+from shopify_encoder import encode
 
-# Key mapping (e.g., map "volume" to "size")
-key_mapping = {
-    "Liter / min.": "Liter min.",
-    "Længde (slange)": "Slange længde",
-    "Liter min": "Liter min.",
-    "Max Tryk": "Maks tryk",
-}
-
-# Value mapping (e.g., map "L" to "Large" and "Small/Medium" to "Small" and "Medium")
-value_mapping = {
-    "Benzin - Diesel": ["Benzin", "Diesel"],
-    "Gas - ilt": ["Gas", "Ilt"],
-    "Gas/ilt": ["Gas", "Ilt"],
-    "Gas og ilt": ["Gas", "Ilt"],
-    "Luft,Vand": ["Luft", "Vand"],
-    "Luft,Vand,Olie": ["Luft", "Vand", "Olie"],
-    "Luft/Vand": ["Luft", "Vand"],
-    "Vand/Hydraulik": ["Vand", "Hydraulik"],
-    "Olie/Kølevæske/Emulsion": ["Olie", "Kølevæske", "Emulsion"],
-    "Propan gas": ["Propan"],
-    "Diesel/Petroleum": ["Diesel", "Petroleum"],
-    "DieselPetroleum": ["Diesel", "Petroleum"],
-    "Luft,Hygiejnisk": ["Luft", "Hygiejnisk"],
-    "Benzin/Diesel": ["Benzin", "Diesel"],
-    "Luft,Vand,Benzin/Diesel": ["Luft", "Vand", "Benzin", "Diesel"],
-    "AD Blue": ["Adblue"],
-    "CEE": ["CEE Stik"],
-    "Schuko": ["Schuko Stik"],
-}
-
-
-consolidation_mapping = {
-    "Luft": "Medie",
-    "Vand": "Medie",
-    "Olie": "Medie",
-    "Fedt": "Medie",
-    "Benzin - Diesel": "Medie",
-    "Adblue": "Medie",
-    "Gas - Ilt": "Medie",
-    "Propan": "Medie",
-}
+# Versioned mapping rules: key_mapping (e.g., map "Max Tryk" to "Maks tryk"),
+# value_mapping (e.g., map "Luft/Vand" to "Luft" and "Vand"),
+# consolidation_mapping (boolean features merged into one key), single_value_keys
+# (slugs dropped when a product has several values) and list_keys
+RULES_PATH = os.environ.get(
+    "PS_MAPPING_RULES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "mapping_rules.json"),
+)
+RULES_KEYS = (
+    "key_mapping",
+    "value_mapping",
+    "consolidation_mapping",
+    "single_value_keys",
+    "list_keys",
+)
 
 
 def metafields_include_key(metafields, key):
@@ -63,6 +39,193 @@ def metafields_include_key(metafields, key):
     return False
 
 
+class FeatureMapper:
+    """
+    Compiled form of the mapping rules.
+
+    Every raw (key, value) pair is resolved once to its mapped key and values,
+    and every mapped key once to its slug and type. Both are cached across products.
+    """
+
+    def __init__(
+        self,
+        key_mapping: dict,
+        value_mapping: dict,
+        consolidation_mapping: dict,
+        single_value_keys=(),
+        list_keys=(),
+        version=None,
+    ):
+        self.version = version
+        self.key_mapping = key_mapping
+        self.value_mapping = value_mapping
+        self.consolidation_mapping = consolidation_mapping
+        self.single_value_keys = set(single_value_keys)
+        self.list_keys = set(list_keys)
+        self._pairs = {}
+        self._keys = {}
+
+    def _compile_pair(self, key, value):
+        """
+        Returns:
+            tuple: (new_key, values), or None if the metafield is dropped.
+        """
+        new_key = self.consolidation_mapping.get(key, self.key_mapping.get(key, key))
+
+        if key in self.consolidation_mapping:
+            # Skip "false" values for consolidated keys
+            if value == "false":
+                return None
+            # Use the original key as the value for "true" values
+            if value == "true":
+                return new_key, (key,)
+
+        # Map values using value_mapping
+        mapped_values = self.value_mapping.get(value, [value])
+        if not isinstance(mapped_values, list):
+            mapped_values = [mapped_values]
+        return new_key, tuple(mapped_values)
+
+    def _compile_key(self, key):
+        """
+        Returns:
+            tuple: (slug, type, is_list, single_value)
+        """
+        slug = slugify(key)
+        is_list = key in self.list_keys
+        return (
+            slug,
+            "list.single_line_text_field" if is_list else "single_line_text_field",
+            is_list,
+            slug in self.single_value_keys,
+        )
+
+    def map(self, metafields):
+        """
+        Maps metafields with namespace "product_feature" to new keys and values.
+
+        Args:
+            metafields (list): List of ShopifyMetaField objects.
+
+        Returns:
+            list: A list of transformed ShopifyMetaField objects.
+        """
+        pairs = self._pairs
+        keys = self._keys
+        transformed_metafields = {}
+        passthrough_metafields = []
+
+        for metafield in metafields:
+            if metafield.namespace != "product_feature":
+                # Pass through non-product_feature metafields unchanged
+                passthrough_metafields.append(metafield)
+                continue
+
+            pair = (metafield.key, metafield.value)
+            if pair in pairs:
+                rule = pairs[pair]
+            else:
+                rule = pairs[pair] = self._compile_pair(*pair)
+            if rule is None:
+                continue
+
+            new_key, values = rule
+            if new_key in transformed_metafields:
+                transformed_metafields[new_key].update(values)
+            else:
+                transformed_metafields[new_key] = set(values)
+
+        product_feature_metafields = []
+        for key, values in transformed_metafields.items():
+            if key in keys:
+                compiled_key = keys[key]
+            else:
+                compiled_key = keys[key] = self._compile_key(key)
+            slug, type, is_list, single_value = compiled_key
+
+            # Remove metafields with multiple values for specific keys
+            if single_value and len(values) > 1:
+                continue
+            product_feature_metafields.append(
+                ShopifyMetaField(
+                    namespace="product_feature",
+                    key=slug,
+                    value=(
+                        json.dumps(list(values))
+                        if (len(values) > 1 or is_list)
+                        else list(values)[0]
+                    ),
+                    type=type,
+                )
+            )
+
+        # Combine product_feature metafields with passthrough metafields
+        return passthrough_metafields + product_feature_metafields
+
+    def map_products(self, products):
+        """
+        Map the metafields of every exported product dict in one call, in place.
+
+        Returns:
+            list: The same products.
+        """
+        for product in products:
+            map_product_features(product, self)
+        return products
+
+
+def load_rules(path: str = RULES_PATH):
+    """
+    Read a rules file and compile it.
+
+    Returns:
+        FeatureMapper: The compiled rules.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        rules = json.load(file)
+    missing = [key for key in RULES_KEYS if key not in rules]
+    if missing:
+        raise ValueError(f"{path} is missing {', '.join(missing)}")
+    return FeatureMapper(
+        *(rules[key] for key in RULES_KEYS), version=rules.get("version")
+    )
+
+
+_mapper = None
+_mapper_source = None
+_mapper_lock = threading.Lock()
+
+
+def get_mapper(path: str = RULES_PATH):
+    """
+    The compiled rules of a rules file, reloaded when the file changes.
+
+    A rules file that fails to load (e.g. while it is being edited) keeps the
+    previous rules in place.
+    """
+    global _mapper, _mapper_source
+    try:
+        source = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        # The file can be missing for a moment while an editor renames it in
+        if _mapper is None:
+            raise
+        return _mapper
+    if source != _mapper_source:
+        with _mapper_lock:
+            if source != _mapper_source:
+                try:
+                    _mapper = load_rules(path)
+                    print(f"Loaded mapping rules version {_mapper.version} from {path}")
+                except (OSError, ValueError, TypeError, AttributeError) as e:
+                    # Unreadable, invalid JSON or rules of the wrong shape
+                    if _mapper is None:
+                        raise
+                    print(f"Keeping mapping rules version {_mapper.version}: {e}")
+                _mapper_source = source
+    return _mapper
+
+
 def feature_mapping(metafields):
     """
     Maps metafields with namespace "product_feature" to new keys and values.
@@ -73,98 +236,43 @@ def feature_mapping(metafields):
     Returns:
         list: A list of transformed ShopifyMetaField objects.
     """
-    transformed_metafields = {}
-    passthrough_metafields = []
-
-    for metafield in metafields:
-        if metafield.namespace != "product_feature":
-            # Pass through non-product_feature metafields unchanged
-            passthrough_metafields.append(metafield)
-            continue
+    return get_mapper().map(metafields)
 
-        new_key = consolidation_mapping.get(
-            metafield.key, key_mapping.get(metafield.key, metafield.key)
-        )
-        new_value = metafield.value
-
-        # Skip "false" values for consolidated keys
-        if metafield.key in consolidation_mapping and new_value == "false":
-            continue
-
-        # Handle consolidated keys with "true" values
-        if metafield.key in consolidation_mapping and new_value == "true":
-            new_value = metafield.key  # Use the original key as the value
-            if new_key in transformed_metafields:
-                transformed_metafields[new_key].add(new_value)
-            else:
-                transformed_metafields[new_key] = {new_value}
-            continue
 
-        # Map values using value_mapping
-        mapped_values = value_mapping.get(new_value, [new_value])
-        if not isinstance(mapped_values, list):
-            mapped_values = [mapped_values]
+def map_product_features(product, feature_mapper: FeatureMapper = None):
+    """
+    Apply feature_mapping to the metafields of an exported product dict, in place.
 
-        # Add or update the transformed metafield
-        if new_key in transformed_metafields:
-            transformed_metafields[new_key].update(mapped_values)
-        else:
-            transformed_metafields[new_key] = set(mapped_values)
-
-    # Convert the transformed_metafields dictionary to a list of ShopifyMetaField objects
-    product_feature_metafields = [
-        ShopifyMetaField(
-            namespace="product_feature",
-            key=slugify(key),
-            value=(
-                json.dumps(list(values))
-                if (len(values) > 1 or key == "Medie")
-                else list(values)[0]
-            ),
-            type=(
-                "list.single_line_text_field"
-                if key == "Medie"
-                else "single_line_text_field"
-            ),
-        )
-        for key, values in transformed_metafields.items()
-        # Remove metafields with multiple values for specific keys - it doesnt make sense to have 2 different lengths for example
-        if not (
-            slugify(key)
-            in ["hojde", "bredde", "laengde", "maks-tryk", "dimension", "liter-min"]
-            and len(values) > 1
-        )
-    ]
-    # TODO Remove duplicates længde etc.
+    Returns:
+        dict: The same product.
+    """
+    if (
+        "metafields" in product
+        and isinstance(product["metafields"], list)
+        and len(product["metafields"]) > 0
+    ):
+        # Convert metafields from dictionaries to ShopifyMetaField objects
+        metafields = [
+            (
+                ShopifyMetaField(**metafield)
+                if isinstance(metafield, dict)
+                else metafield
+            )
+            for metafield in product["metafields"]
+        ]
 
-    # Combine product_feature metafields with passthrough metafields
-    return passthrough_metafields + product_feature_metafields
+        transformed_metafields = (feature_mapper or get_mapper()).map(metafields)
+        product["metafields"] = [
+            encode(metafield) for metafield in transformed_metafields
+        ]
+    return product
 
 
 def run_feature_mapping(path):
     with open(path, "r") as file:
         data = json.load(file)
 
-    for product in data:
-        if (
-            "metafields" in product
-            and isinstance(product["metafields"], list)
-            and len(product["metafields"]) > 0
-        ):
-            # Convert metafields from dictionaries to ShopifyMetaField objects
-            metafields = [
-                (
-                    ShopifyMetaField(**metafield)
-                    if isinstance(metafield, dict)
-                    else metafield
-                )
-                for metafield in product["metafields"]
-            ]
-
-            transformed_metafields = feature_mapping(metafields)
-            product["metafields"] = [
-                metafield.to_dict() for metafield in transformed_metafields
-            ]
+    get_mapper().map_products(data)
 
     with open("dump/transformed_shopify_products.json", "w") as file:
         json.dump(data, file, indent=2)
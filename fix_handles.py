@@ -1,20 +1,6 @@
 import json
 
-
-used_handles = set()
-
-
-def ensure_unique_handle(handle):
-    """
-    Ensure the handle is unique by appending a small suffix if necessary.
-    """
-    original_handle = handle
-    counter = 1
-    while handle in used_handles:
-        handle = f"{original_handle}-{counter}"
-        counter += 1
-    used_handles.add(handle)
-    return handle
+from handle_registry import product_owner, registry
 
 
 with open("dump/transformed_shopify_products.json", "r") as file:
@@ -22,7 +8,7 @@ with open("dump/transformed_shopify_products.json", "r") as file:
 
 for product in data:
     if "handle" in product:
-        product["handle"] = ensure_unique_handle(product["handle"])
+        product["handle"] = registry.allocate(product["handle"], product_owner(product))
     if "brand" in product:
         product["brand"]["handle"] = {
             "handle": product["brand"]["handle"],
@@ -31,3 +17,5 @@ for product in data:
 
 with open("dump/handles_transformed_shopify_products.json", "w") as file:
     json.dump(data, file, indent=2)
+
+registry.save()
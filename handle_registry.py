@@ -0,0 +1,187 @@
+import json
+import os
+import re
+import sys
+import threading
+
+REGISTRY_PATH = os.path.join("dump", "handle_registry.json")
+REGISTRY_VERSION = 2
+
+
+def product_owner(product):
+    """
+    PrestaShop id of an exported product dict, from its prestashop.id metafield.
+    """
+    for metafield in product.get("metafields") or []:
+        if metafield.get("namespace") == "prestashop" and metafield.get("key") == "id":
+            return str(metafield.get("value"))
+    return None
+
+
+def product_handle(product):
+    if "product" in product:
+        return product["product"].get("handle")
+    return product.get("handle")
+
+
+class HandleRegistry:
+    """
+    Registry of the product handles in use, persisted between runs.
+
+    Each base handle keeps the next free suffix, so allocating a handle does not
+    probe -1, -2, ... again. Handles remember the product (owner) they were
+    given to and the base they were allocated for, and an owner gets its own
+    handle back on the next export for the same base instead of a new suffix.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH):
+        self.path = path
+        self.handles = {}
+        self.owners = {}
+        # Base handle each owner's handle was allocated for
+        self.bases = {}
+        self.next_suffix = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") not in (1, REGISTRY_VERSION):
+            raise ValueError(f"Unsupported handle registry version in {self.path}")
+        self.handles = data["handles"]
+        self.next_suffix = data["next_suffix"]
+        # Version 1 did not store bases, they are learned on the next allocate
+        self.bases = data.get("bases", {})
+        self.owners = {
+            owner: handle for handle, owner in self.handles.items() if owner is not None
+        }
+
+    def save(self):
+        """
+        Write the registry atomically.
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {
+                "version": REGISTRY_VERSION,
+                "handles": self.handles,
+                "next_suffix": self.next_suffix,
+                "bases": self.bases,
+            }
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(self.path + ".tmp", self.path)
+
+    def __contains__(self, handle):
+        return handle in self.handles
+
+    def __len__(self):
+        return len(self.handles)
+
+    def _owned_handle(self, base, owner):
+        handle = self.owners.get(owner)
+        if handle is None:
+            return None
+        if handle == base:
+            # The owner's own handle passed back in (fix_handles), keep its base
+            return handle
+        owned_base = self.bases.get(owner)
+        if owned_base is None:
+            # Handle without a known base (version 1 registry or added as is)
+            if re.fullmatch(re.escape(base) + r"-\d+", handle):
+                self.bases[owner] = base
+                return handle
+        elif owned_base == base:
+            return handle
+        # The product got a new base handle, release the old one
+        del self.handles[handle]
+        del self.owners[owner]
+        self.bases.pop(owner, None)
+        return None
+
+    def allocate(self, base: str, owner=None):
+        """
+        Return base, or base with the next free suffix if base is taken.
+
+        Args:
+            base (str): The wanted handle.
+            owner: PrestaShop id of the product. A product that already has a
+                handle for this base keeps it.
+        """
+        owner = None if owner is None else str(owner)
+        with self._lock:
+            if owner is not None:
+                handle = self._owned_handle(base, owner)
+                if handle is not None:
+                    return handle
+
+            handle = base
+            suffix = self.next_suffix.get(base, 1)
+            # A suffixed handle can also be the base of another product
+            while handle in self.handles:
+                handle = f"{base}-{suffix}"
+                suffix += 1
+            if handle != base:
+                self.next_suffix[base] = suffix
+
+            self.handles[handle] = owner
+            if owner is not None:
+                self.owners[owner] = handle
+                self.bases[owner] = base
+            return handle
+
+    def add(self, handle: str, owner=None):
+        """
+        Register a handle that is already in use, as is. An owner that already
+        has this handle keeps its base, any other handle of the owner is released.
+        """
+        owner = None if owner is None else str(owner)
+        with self._lock:
+            previous_owner = self.handles.get(handle)
+            if previous_owner not in (None, owner):
+                del self.owners[previous_owner]
+                self.bases.pop(previous_owner, None)
+            self.handles[handle] = owner
+            if owner is not None:
+                previous_handle = self.owners.get(owner)
+                if previous_handle != handle:
+                    if previous_handle is not None:
+                        del self.handles[previous_handle]
+                    self.bases.pop(owner, None)
+                self.owners[owner] = handle
+
+    def seed(self, path: str):
+        """
+        Register the handles of an existing export (JSON list or JSONL).
+
+        Returns:
+            int: Number of handles registered.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                products = [
+                    json.loads(line).get("input", {}) for line in f if line.strip()
+                ]
+            else:
+                products = json.load(f)
+
+        count = 0
+        for product in products:
+            handle = product_handle(product)
+            if handle:
+                self.add(handle, product_owner(product))
+                count += 1
+        return count
+
+
+registry = HandleRegistry()
+
+
+if __name__ == "__main__":
+    for export_path in sys.argv[1:]:
+        print(f"Registered {registry.seed(export_path)} handles from {export_path}")
+    registry.save()
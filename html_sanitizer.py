@@ -0,0 +1,97 @@
+import hashlib
+from collections import OrderedDict
+
+from bs4 import BeautifulSoup
+
+# Tags that lose their class and style attributes
+CLEANED_TAGS = {"p", "span", "div"}
+# Maximum number of memoized results
+MEMO_SIZE = 20000
+# Fragments sent to a worker process at a time by sanitize_batch
+CHUNKSIZE = 8
+# html.parser is kept as the backend: lxml/html5lib add <html>/<body> wrappers
+# and normalize markup differently, which would change the output
+PARSER = "html.parser"
+
+_memo = OrderedDict()
+
+
+def _key(html_content: str):
+    return hashlib.blake2b(html_content.encode("utf-8"), digest_size=16).digest()
+
+
+def _sanitize(html_content: str):
+    """
+    Remove class/style attributes from p, span and div tags and drop <style>
+    elements, in a single walk over the tree.
+    """
+    soup = BeautifulSoup(html_content, PARSER)
+    styles = []
+    for tag in soup.find_all(True):
+        if tag.name in CLEANED_TAGS:
+            tag.attrs.pop("class", None)
+            tag.attrs.pop("style", None)
+        elif tag.name == "style":
+            styles.append(tag)
+    for style in styles:
+        style.decompose()
+    return str(soup)
+
+
+def _remember(key, cleaned):
+    _memo[key] = cleaned
+    if len(_memo) > MEMO_SIZE:
+        _memo.popitem(last=False)
+
+
+def sanitize_html(html_content):
+    """
+    Clean an HTML fragment, memoized by content hash.
+    """
+    if not html_content:
+        return ""
+
+    key = _key(html_content)
+    if key in _memo:
+        _memo.move_to_end(key)
+        return _memo[key]
+
+    cleaned = _sanitize(html_content)
+    _remember(key, cleaned)
+    return cleaned
+
+
+def sanitize_batch(html_contents, executor=None):
+    """
+    Clean a batch of HTML fragments. Fragments that are not memoized yet are
+    cleaned once each, in the given process pool if any.
+
+    Args:
+        html_contents (iterable): The HTML fragments.
+        executor (ProcessPoolExecutor): Pool shared by the batches of an export,
+            None cleans in this process.
+
+    Returns:
+        list: The cleaned fragments in the same order.
+    """
+    html_contents = list(html_contents)
+    missing = {}
+    for html_content in html_contents:
+        if html_content:
+            key = _key(html_content)
+            if key not in _memo:
+                missing[key] = html_content
+
+    if missing:
+        keys = list(missing)
+        if executor is not None and len(keys) > 1:
+            results = executor.map(
+                _sanitize, [missing[key] for key in keys], chunksize=CHUNKSIZE
+            )
+            for key, cleaned in zip(keys, results):
+                _remember(key, cleaned)
+        else:
+            for key in keys:
+                _remember(key, _sanitize(missing[key]))
+
+    return [sanitize_html(html_content) for html_content in html_contents]
@@ -0,0 +1,38 @@
+import json
+
+
+class JsonArrayWriter:
+    """
+    Write a JSON array one item at a time.
+
+    The output is identical to json.dump(items, f, indent=2), without holding
+    all items in memory.
+    """
+
+    def __init__(self, path: str, indent: int = 2, **dump_kwargs):
+        self.path = path
+        self.indent = indent
+        self.dump_kwargs = dump_kwargs
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write("[")
+        return self
+
+    def write(self, item):
+        text = json.dumps(item, indent=self.indent, **self.dump_kwargs)
+        padding = " " * self.indent
+        # JSON strings never contain raw newlines, so every line can be indented
+        text = "\n".join(padding + line for line in text.split("\n"))
+        self._file.write(("\n" if self.count == 0 else ",\n") + text)
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # A failed run leaves the array unclosed, so it is never mistaken for a
+        # complete one
+        if exc_type is None:
+            self._file.write("\n]" if self.count else "]")
+        self._file.close()
+        self._file = None
@@ -1,17 +1,64 @@
-from dump_products import dump_products
+import argparse
+import os
+
 from feature_mapping import run_feature_mapping
 from to_jsonl import convert_to_jsonl
 from add_skus import run_skus
+from pipeline import TAPS, run_pipeline
 
 if __name__ == "__main__":
-    # Dump products
-    path = dump_products()
+    parser = argparse.ArgumentParser(
+        description="Export PrestaShop products to Shopify"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only export products changed since the last incremental export",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted export from dump/checkpoint.jsonl",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream each product through all stages to the JSONL in a single pass",
+    )
+    parser.add_argument(
+        "--taps",
+        nargs="*",
+        choices=list(TAPS),
+        default=[],
+        help="With --stream, also write these intermediate files",
+    )
+    parser.add_argument(
+        "--remap",
+        action="store_true",
+        help="Re-apply the mapping rules to dump/shopify_products.json without fetching",
+    )
+    args = parser.parse_args()
+    if args.remap and (args.stream or args.incremental or args.resume):
+        parser.error("--remap only works on an existing dump")
+
+    if args.stream:
+        # Single pass from PrestaShop to jsonl
+        run_pipeline(incremental=args.incremental, resume=args.resume, taps=args.taps)
+    else:
+        if args.remap:
+            # Reuse the last dump, only the stages after it are run
+            path = os.path.join("dump", "shopify_products.json")
+        else:
+            # Dump products. Imported here, as it needs the PrestaShop credentials
+            from dump_products import dump_products
+
+            path = dump_products(incremental=args.incremental, resume=args.resume)
 
-    # Feature mapping
-    path = run_feature_mapping(path)
+        # Feature mapping
+        path = run_feature_mapping(path)
 
-    # Add SKUs
-    path = run_skus(path)
+        # Add SKUs
+        path = run_skus(path)
 
-    # To jsonl
-    convert_to_jsonl(path)
+        # To jsonl
+        convert_to_jsonl(path)
@@ -0,0 +1,85 @@
+import os
+from contextlib import ExitStack
+
+from add_skus import OUTPUT_PATH as SKUS_PATH
+from add_skus import SkuAllocator
+from feature_mapping import map_product_features
+from json_writer import JsonArrayWriter
+from to_jsonl import OUTPUT_PATH, write_jsonl
+
+# Intermediate files of the staged pipeline, written by the debug taps.
+# The json.dump settings match the files written by the separate stages.
+TAPS = {
+    "dump": (os.path.join("dump", "shopify_products.json"), {}),
+    "features": (os.path.join("dump", "transformed_shopify_products.json"), {}),
+    "skus": (SKUS_PATH, {"ensure_ascii": False}),
+}
+
+
+def run_pipeline(
+    incremental: bool = False,
+    resume: bool = False,
+    taps=(),
+    path: str = OUTPUT_PATH,
+):
+    """
+    Export products to the final JSONL in a single pass.
+
+    Each product flows through the export, feature mapping and SKU assignment
+    and is written to the JSONL before the next one, instead of the whole
+    catalog being written and read back between stages.
+
+    Every IC reference in PrestaShop is observed before the first product, as
+    the SKUs of the export are only known at the end. Variants already in the
+    SKU index keep their number unless it is one of those references.
+
+    Args:
+        incremental (bool): Only export products changed since the last
+            incremental export.
+        resume (bool): Continue an interrupted export from the checkpoint.
+        taps (iterable): Names from TAPS whose intermediate file is also written.
+        path (str): Path of the JSONL file.
+
+    Returns:
+        str: The path of the JSONL file.
+    """
+    # Imported here so TAPS can be used without the PrestaShop credentials
+    from dump_products import iter_shopify_products
+    from ps_services import list_ic_references
+
+    os.makedirs("dump", exist_ok=True)
+    allocator = SkuAllocator()
+    for reference in list_ic_references():
+        allocator.observe(reference)
+
+    with ExitStack() as stack:
+        writers = {}
+        for tap in taps:
+            tap_path, dump_kwargs = TAPS[tap]
+            # Taps are moved into place only once the whole run has succeeded
+            writers[tap] = stack.enter_context(
+                JsonArrayWriter(tap_path + ".tmp", **dump_kwargs)
+            )
+
+        def products():
+            for product in iter_shopify_products(
+                incremental=incremental, resume=resume
+            ):
+                if "dump" in writers:
+                    writers["dump"].write(product)
+                map_product_features(product)
+                if "features" in writers:
+                    writers["features"].write(product)
+                allocator.assign_product(product)
+                if "skus" in writers:
+                    writers["skus"].write(product)
+                yield product
+
+        count = write_jsonl(products(), path)
+    for tap in writers:
+        tap_path = TAPS[tap][0]
+        os.replace(tap_path + ".tmp", tap_path)
+    allocator.save()
+
+    print(f"Streamed {count} products to {path}")
+    return path
@@ -0,0 +1,165 @@
+import asyncio
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+from ps_services import (
+    PS_API_URL,
+    PS_SHOP_URL,
+    get_association,
+    get_category,
+    get_combination_ids,
+    get_combinations,
+    get_product_image,
+    get_stock_index,
+    needs_image_legends,
+)
+from ps_catalog import (
+    get_cached_manufacturer,
+    get_cached_supplier_name,
+    get_feature_name,
+    get_feature_value_name,
+)
+from url_resolver import category_url, product_url
+
+load_dotenv()
+
+# Maximum number of lookups in flight in total and per host. The webservice
+# and the storefront usually share one host, which then gets the per-host limit.
+MAX_CONCURRENCY = int(os.environ.get("PS_MAX_CONCURRENCY", 8))
+MAX_CONCURRENCY_PER_HOST = int(os.environ.get("PS_MAX_CONCURRENCY_PER_HOST", 4))
+
+API_HOST = urlparse(PS_API_URL).netloc
+SHOP_HOST = urlparse(PS_SHOP_URL).netloc
+
+
+class AsyncFetcher:
+    """
+    Runs the blocking ps_services lookups on a thread pool, bounded by a global
+    semaphore and a semaphore per host.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = MAX_CONCURRENCY,
+        per_host: int = MAX_CONCURRENCY_PER_HOST,
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self._semaphore = None
+        self._host_semaphores = None
+        self._executor = None
+
+    async def __aenter__(self):
+        # Semaphores must be created inside the running event loop
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._host_semaphores = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown(wait=True)
+
+    async def run(self, host: str, func, *args):
+        async with self._semaphore, self._host_semaphores[host]:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+
+def _category_ids(product, skip_categories):
+    return [
+        category["id"]
+        for category in get_association(product, "categories", "category")
+        if category["id"] not in skip_categories
+    ]
+
+
+async def _enrich_category(fetcher, category_id):
+    category = await fetcher.run(API_HOST, get_category, category_id)
+    if category["category"].get("active", False):
+        await fetcher.run(SHOP_HOST, category_url, category["category"])
+
+
+async def _enrich_product(fetcher, product):
+    lookups = [fetcher.run(SHOP_HOST, product_url, product)]
+    # Image URLs come from the payload, only legends (or the fallback) need a request
+    if needs_image_legends(product):
+        lookups.append(fetcher.run(API_HOST, get_product_image, product["id"]))
+    for feature in get_association(product, "product_features", "product_feature"):
+        lookups.append(fetcher.run(API_HOST, get_feature_name, feature["id"]))
+        lookups.append(
+            fetcher.run(API_HOST, get_feature_value_name, feature["id_feature_value"])
+        )
+
+    await asyncio.gather(*lookups)
+
+
+async def enrich_products_async(
+    products,
+    skip_categories=(),
+    concurrency: int = MAX_CONCURRENCY,
+    per_host: int = MAX_CONCURRENCY_PER_HOST,
+):
+    """
+    Issue every independent lookup for a batch of products concurrently.
+
+    Lookups that are memoized in ps_services, ps_catalog and url_resolver
+    (images, categories, features, suppliers, manufacturers, URLs) are warmed, so the
+    sequential transform afterwards only reads from memory.
+
+    Returns:
+        tuple: (combinations, stock_index) for the batch.
+    """
+    async with AsyncFetcher(concurrency, per_host) as fetcher:
+        combination_ids = [
+            combination_id
+            for product in products
+            for combination_id in get_combination_ids(product)
+        ]
+        product_ids = [product["id"] for product in products]
+        # Shared lookups are issued once per page, not once per product
+        category_ids = dict.fromkeys(
+            category_id
+            for product in products
+            for category_id in _category_ids(product, skip_categories)
+        )
+        supplier_ids = dict.fromkeys(product["id_supplier"] for product in products)
+        manufacturer_ids = dict.fromkeys(
+            product["id_manufacturer"]
+            for product in products
+            if product["id_manufacturer"] != "0"
+        )
+
+        combinations, stock_index, *_ = await asyncio.gather(
+            fetcher.run(API_HOST, get_combinations, combination_ids),
+            fetcher.run(API_HOST, get_stock_index, product_ids),
+            *[_enrich_product(fetcher, product) for product in products],
+            *[_enrich_category(fetcher, category_id) for category_id in category_ids],
+            *[
+                fetcher.run(API_HOST, get_cached_supplier_name, supplier_id)
+                for supplier_id in supplier_ids
+            ],
+            *[
+                fetcher.run(API_HOST, get_cached_manufacturer, manufacturer_id)
+                for manufacturer_id in manufacturer_ids
+            ],
+        )
+
+    return combinations, stock_index
+
+
+def enrich_products(
+    products,
+    skip_categories=(),
+    concurrency: int = MAX_CONCURRENCY,
+    per_host: int = MAX_CONCURRENCY_PER_HOST,
+):
+    """
+    Synchronous wrapper around enrich_products_async.
+    """
+    return asyncio.run(
+        enrich_products_async(products, skip_categories, concurrency, per_host)
+    )
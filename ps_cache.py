@@ -0,0 +1,195 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHE_PATH = os.environ.get(
+    "PS_CACHE_PATH", os.path.join(".cache", "ps_responses.sqlite3")
+)
+# Skip the cache entirely (no reads, no writes)
+CACHE_BYPASS = os.environ.get("PS_CACHE_BYPASS", "0") == "1"
+CACHE_MAX_BYTES = int(os.environ.get("PS_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Time to live in seconds per resource. Reference data changes rarely, stock often.
+CACHE_TTLS = {
+    "product_features": 7 * DAY,
+    "product_feature_values": 7 * DAY,
+    "product_options": 7 * DAY,
+    "product_option_values": 7 * DAY,
+    "categories": 7 * DAY,
+    "manufacturers": 7 * DAY,
+    "suppliers": 7 * DAY,
+    "images/products": DAY,
+    "products": HOUR,
+    "combinations": HOUR,
+    "stock_availables": 5 * 60,
+    # Canonical storefront URLs resolved by url_resolver
+    "urls": 30 * DAY,
+}
+DEFAULT_TTL = HOUR
+
+# Check the total size every n writes
+EVICTION_INTERVAL = 100
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of PrestaShop webservice responses,
+    keyed by resource, id and request options.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttls: dict = None,
+        max_bytes: int = CACHE_MAX_BYTES,
+        bypass: bool = CACHE_BYPASS,
+    ):
+        self.path = path
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._detached = []
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    resource TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def detach(self):
+        """
+        Stop using the current connection, e.g. one inherited by a forked
+        process, and reconnect on the next access. The old connection is kept
+        open, since closing it would release the file locks of the parent.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._detached.append(self._connection)
+                self._connection = None
+
+    @staticmethod
+    def make_key(resource: str, id=None, options: dict = None):
+        options = json.dumps(options or {}, sort_keys=True)
+        return f"{resource}|{'' if id is None else id}|{options}"
+
+    def ttl(self, resource: str):
+        return self.ttls.get(resource, DEFAULT_TTL)
+
+    def get(self, resource: str, id=None, options: dict = None):
+        """
+        Return the cached response, or None if missing or expired.
+        """
+        if self.bypass:
+            return None
+
+        key = self.make_key(resource, id, options)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl(resource):
+                self.misses += 1
+                return None
+            connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, resource: str, id, options: dict, response):
+        if self.bypass:
+            return
+
+        key = self.make_key(resource, id, options)
+        value = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, resource, value, len(value), now, now),
+            )
+            connection.commit()
+            self._writes += 1
+            if self._writes % EVICTION_INTERVAL == 0:
+                self._evict()
+
+    def _evict(self):
+        """
+        Delete least recently used entries until the cache is below 90% of max_bytes.
+        Expects the lock to be held.
+        """
+        connection = self._connect()
+        total = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        rows = connection.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall()
+        keys = []
+        for key, size in rows:
+            if total <= target:
+                break
+            keys.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+        connection.commit()
+
+    def clear(self, resource: str = None):
+        with self._lock:
+            connection = self._connect()
+            if resource is None:
+                connection.execute("DELETE FROM responses")
+            else:
+                connection.execute(
+                    "DELETE FROM responses WHERE resource = ?", (resource,)
+                )
+            connection.commit()
+
+    def print_stats(self):
+        if self.bypass:
+            print("Response cache bypassed")
+            return
+        print(f"Response cache: {self.hits} hits, {self.misses} misses")
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,209 @@
+from collections import Counter
+
+from ps_services import (
+    as_list,
+    get_feature,
+    get_feature_value,
+    get_features,
+    get_feature_values,
+    get_manufacturer,
+    get_supplier,
+    list_manufacturers,
+    list_suppliers,
+    get_product_option,
+    get_product_option_values,
+    list_product_option_values,
+    list_product_options,
+)
+
+# Reference data shared by every product, loaded once per run
+_feature_names = {}
+_feature_values = {}
+_features_loaded = False
+_option_values = {}
+_options = {}
+_attributes_loaded = False
+_manufacturers = {}
+_suppliers = {}
+_entities_loaded = False
+
+# Hit/miss counters per cache, e.g. cache_stats["manufacturers.hit"]
+cache_stats = Counter()
+
+
+def load_features():
+    """
+    Load all product_features and product_feature_values in two display=full requests.
+    """
+    global _features_loaded
+
+    features = get_features()
+    if features.get("product_features"):
+        for feature in as_list(features["product_features"]["product_feature"]):
+            _feature_names[str(feature["id"])] = feature["name"]["language"]["value"]
+
+    feature_values = get_feature_values()
+    if feature_values.get("product_feature_values"):
+        for feature_value in as_list(
+            feature_values["product_feature_values"]["product_feature_value"]
+        ):
+            _feature_values[str(feature_value["id"])] = feature_value["value"][
+                "language"
+            ]["value"]
+
+    _features_loaded = True
+    print(
+        f"Loaded {len(_feature_names)} features and {len(_feature_values)} feature values"
+    )
+
+
+def get_feature_name(id: int):
+    """
+    Resolve a feature name from the preloaded dictionary.
+    Features created after the preload are fetched and cached individually.
+    """
+    if not _features_loaded:
+        load_features()
+    id = str(id)
+    if id not in _feature_names:
+        feature = get_feature(id)
+        _feature_names[id] = feature["product_feature"]["name"]["language"]["value"]
+    return _feature_names[id]
+
+
+def get_feature_value_name(id: int):
+    """
+    Resolve a feature value from the preloaded dictionary.
+    Values created after the preload (e.g. custom values) are fetched and cached individually.
+    """
+    if not _features_loaded:
+        load_features()
+    id = str(id)
+    if id not in _feature_values:
+        feature_value = get_feature_value(id)
+        _feature_values[id] = feature_value["product_feature_value"]["value"][
+            "language"
+        ]["value"]
+    return _feature_values[id]
+
+
+def load_attributes():
+    """
+    Load all product_option_values and product_options (attribute groups) in two
+    display=full requests.
+    """
+    global _attributes_loaded
+
+    option_values = list_product_option_values()
+    if option_values.get("product_option_values"):
+        for option_value in as_list(
+            option_values["product_option_values"]["product_option_value"]
+        ):
+            _option_values[str(option_value["id"])] = (
+                option_value["name"]["language"]["value"],
+                str(option_value["id_attribute_group"]),
+            )
+
+    options = list_product_options()
+    if options.get("product_options"):
+        for option in as_list(options["product_options"]["product_option"]):
+            _options[str(option["id"])] = option["name"]["language"]["value"]
+
+    _attributes_loaded = True
+    print(
+        f"Loaded {len(_options)} attribute groups and {len(_option_values)} attribute values"
+    )
+
+
+def get_option_names(option_value_id: int):
+    """
+    Resolve an option value id to (value_name, option_name).
+
+    Returns:
+        tuple: (None, None) if the attribute group no longer exists.
+    """
+    if not _attributes_loaded:
+        load_attributes()
+
+    option_value_id = str(option_value_id)
+    if option_value_id not in _option_values:
+        option_value = get_product_option_values(option_value_id)
+        _option_values[option_value_id] = (
+            option_value["product_option_value"]["name"]["language"]["value"],
+            str(option_value["product_option_value"]["id_attribute_group"]),
+        )
+    option_value_name, option_id = _option_values[option_value_id]
+
+    if option_id not in _options:
+        option = get_product_option(option_id)
+        # Remember missing groups too, so they are not requested again
+        _options[option_id] = (
+            option["product_option"]["name"]["language"]["value"] if option else None
+        )
+    option_name = _options[option_id]
+
+    if option_name is None:
+        return None, None
+    return option_value_name, option_name
+
+
+def load_entities():
+    """
+    Load all manufacturers and suppliers with one display=full listing each.
+    Entries are stored in the same shape as a single get, e.g. {"manufacturer": {...}}.
+    """
+    global _entities_loaded
+
+    manufacturers = list_manufacturers()
+    if manufacturers.get("manufacturers"):
+        for manufacturer in as_list(manufacturers["manufacturers"]["manufacturer"]):
+            _manufacturers[str(manufacturer["id"])] = {"manufacturer": manufacturer}
+
+    suppliers = list_suppliers()
+    if suppliers.get("suppliers"):
+        for supplier in as_list(suppliers["suppliers"]["supplier"]):
+            _suppliers[str(supplier["id"])] = {"supplier": supplier}
+
+    _entities_loaded = True
+    print(f"Loaded {len(_manufacturers)} manufacturers and {len(_suppliers)} suppliers")
+
+
+def get_cached_manufacturer(id: int):
+    """
+    Memoized get_manufacturer. Returns None for unknown manufacturers, like get_manufacturer.
+    """
+    if not _entities_loaded:
+        load_entities()
+    id = str(id)
+    if id in _manufacturers:
+        cache_stats["manufacturers.hit"] += 1
+    else:
+        cache_stats["manufacturers.miss"] += 1
+        _manufacturers[id] = get_manufacturer(id)
+    return _manufacturers[id]
+
+
+def get_cached_supplier_name(id: int):
+    """
+    Memoized get_supplier_name.
+    """
+    if not _entities_loaded:
+        load_entities()
+    id = str(int(id))
+    if id == "0":
+        return ""
+    if id in _suppliers:
+        cache_stats["suppliers.hit"] += 1
+    else:
+        cache_stats["suppliers.miss"] += 1
+        _suppliers[id] = get_supplier(id)
+    return _suppliers[id]["supplier"]["name"]
+
+
+def print_cache_stats():
+    caches = sorted({key.split(".")[0] for key in cache_stats})
+    for cache in caches:
+        print(
+            f"{cache} cache: {cache_stats[cache + '.hit']} hits, "
+            f"{cache_stats[cache + '.miss']} misses"
+        )
@@ -1,14 +1,23 @@
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 
 from prestapyt import PrestaShopWebServiceDict, PrestaShopWebServiceError
 
 from dotenv import load_dotenv
 
+from ps_cache import response_cache
+from ps_throttle import is_transient, throttle
+from ps_transport import api_session
+
 load_dotenv()
 
 PS_API_KEY = os.environ.get("PS_API_KEY")
 PS_API_URL = "https://induclean.dk/api"
+PS_SHOP_URL = "https://induclean.dk"
+# Fetch image legends from the images endpoint (one cached request per product
+# with images). Otherwise the alt text defaults to the product name.
+IMAGE_ALT_PRODUCT_NAME = os.environ.get("PS_IMAGE_ALT_PRODUCT_NAME", "0") == "1"
 
 
 if PS_API_KEY is None:
@@ -20,21 +29,36 @@ if PS_API_URL is None:
 prestashop = PrestaShopWebServiceDict(
     PS_API_URL,
     PS_API_KEY,
+    session=api_session,
 )
 
 
+def ps_get(resource: str, id: int = None, options: dict = None):
+    """
+    Single entry point for every GET against the PrestaShop webservice.
+    Responses are served from the persistent response cache when still fresh.
+    """
+    response = response_cache.get(resource, id, options)
+    if response is not None:
+        return response
+
+    response = throttle.call(prestashop.get, resource, id, options=options)
+    response_cache.set(resource, id, options, response)
+    return response
+
+
 def get_products(id: int = None, limit: int = 100, random_sample: bool = False):
     if id:
-        return prestashop.get("products", id)
+        return ps_get("products", id)
 
     if random_sample:
-        all_products = prestashop.get("products", options={"filter[active]": "[1]"})[
+        all_products = ps_get("products", options={"filter[active]": "[1]"})[
             "products"
         ]["product"]
         all_product_ids = [product["attrs"]["id"] for product in all_products]
         rnd_product_ids = random.sample(all_product_ids, k=limit)
         id_filter = "|".join(map(str, rnd_product_ids))
-        return prestashop.get(
+        return ps_get(
             "products",
             options={
                 "display": "full",
@@ -44,7 +68,7 @@ def get_products(id: int = None, limit: int = 100, random_sample: bool = False):
         )
 
     if id is None and limit > 1:
-        return prestashop.get(
+        return ps_get(
             "products",
             id,
             options={"display": "full", "filter[active]": "[1]", "limit": limit},
@@ -55,45 +79,291 @@ def get_products(id: int = None, limit: int = 100, random_sample: bool = False):
     )
 
 
+PRODUCTS_PAGE_SIZE = 50
+
+
+def get_products_page(offset: int, count: int, options: dict = None):
+    """
+    Fetch one page of active products using PrestaShop's limit=offset,count syntax.
+    """
+    response = ps_get(
+        "products",
+        options={
+            "display": "full",
+            "filter[active]": "[1]",
+            "sort": "[id_ASC]",
+            **(options or {}),
+            "limit": f"{offset},{count}",
+        },
+    )
+    if not response.get("products"):
+        return []
+    return as_list(response["products"]["product"])
+
+
+def iter_product_pages(
+    page_size: int = PRODUCTS_PAGE_SIZE,
+    limit: int = None,
+    prefetch: bool = True,
+    options: dict = None,
+):
+    """
+    Yield pages (lists) of products until the catalog or the limit is exhausted.
+
+    Args:
+        page_size (int): Number of products per request.
+        limit (int): Maximum number of products in total, None for the whole catalog.
+        prefetch (bool): Fetch the next page in the background while the current
+            one is being processed.
+        options (dict): Extra query options, e.g. filters.
+    """
+
+    def page_count(offset):
+        if limit is None:
+            return page_size
+        return max(min(page_size, limit - offset), 0)
+
+    def fetch(offset):
+        count = page_count(offset)
+        if count == 0:
+            return []
+        return get_products_page(offset, count, options)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        offset = 0
+        next_page = executor.submit(fetch, offset) if prefetch else None
+        while True:
+            page = next_page.result() if prefetch else fetch(offset)
+            if not page:
+                return
+            requested = page_count(offset)
+            offset += len(page)
+            last_page = len(page) < requested or page_count(offset) == 0
+            if prefetch and not last_page:
+                next_page = executor.submit(fetch, offset)
+            yield page
+            if last_page:
+                return
+
+
+def iter_products(
+    page_size: int = PRODUCTS_PAGE_SIZE,
+    limit: int = None,
+    prefetch: bool = True,
+    options: dict = None,
+):
+    """
+    Yield products one at a time, see iter_product_pages.
+    """
+    for page in iter_product_pages(page_size, limit, prefetch, options):
+        yield from page
+
+
+def iter_products_by_ids(ids, page_size: int = PRODUCTS_PAGE_SIZE):
+    """
+    Yield pages of active products for the given ids, using filter[id]=[a|b|c].
+    """
+    ids = list(dict.fromkeys(str(id) for id in ids))
+    for start in range(0, len(ids), page_size):
+        chunk = ids[start : start + page_size]
+        page = get_products_page(
+            0, len(chunk), options={"filter[id]": f"[{'|'.join(chunk)}]"}
+        )
+        if page:
+            yield page
+
+
+def get_updated_product_ids(since: str, until: str):
+    """
+    Ids of active products with date_upd between since and until ("%Y-%m-%d %H:%M:%S").
+    """
+    response = ps_get(
+        "products",
+        options={
+            "display": "[id]",
+            "filter[active]": "[1]",
+            "filter[date_upd]": f"[{since},{until}]",
+            "date": "1",
+        },
+    )
+    if not response.get("products"):
+        return []
+    return [str(product["id"]) for product in as_list(response["products"]["product"])]
+
+
+def get_latest_product_update():
+    """
+    Highest date_upd of all products, in the shop's timezone like the
+    date_upd filter of get_updated_product_ids.
+
+    Returns:
+        str: "%Y-%m-%d %H:%M:%S", or None if the catalog is empty.
+    """
+    response = ps_get(
+        "products",
+        options={"display": "[id,date_upd]", "sort": "[date_upd_DESC]", "limit": "1"},
+    )
+    if not response.get("products"):
+        return None
+    return as_list(response["products"]["product"])[0]["date_upd"]
+
+
+def list_stock_availables():
+    return ps_get(
+        "stock_availables",
+        options={"display": "[id_product,id_product_attribute,quantity]"},
+    )
+
+
+def list_combinations():
+    return ps_get(
+        "combinations",
+        options={"display": "[id,id_product,price,wholesale_price,reference,ean13]"},
+    )
+
+
+def list_ic_references():
+    """
+    All IC references of products and combinations, including inactive ones.
+    """
+    references = []
+    for resource in ("products", "combinations"):
+        response = ps_get(
+            resource,
+            options={"display": "[reference]", "filter[reference]": "[IC]%"},
+        )
+        if response.get(resource):
+            references.extend(
+                item["reference"] for item in as_list(response[resource][resource[:-1]])
+            )
+    return references
+
+
 def get_product(id: int):
-    return prestashop.get("products", id)
+    return ps_get("products", id)
 
 
 def get_combination(id: int):
-    return prestashop.get("combinations", id)
+    return ps_get("combinations", id)
+
+
+COMBINATIONS_CHUNK_SIZE = 50
+
+
+def as_list(payload):
+    """
+    PrestaShop returns a dict for a single element and a list for several.
+    Normalize both (and empty payloads) to a list.
+    """
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict):
+        return [payload]
+    return []
+
+
+def get_association(product, association: str, item: str):
+    """
+    Items of an association of a display=full product, e.g.
+    ("combinations", "combination"), normalized to a list.
+    """
+    items = product["associations"].get(association)
+    if not isinstance(items, dict):
+        return []
+    return as_list(items.get(item))
+
+
+def get_combination_ids(product):
+    """
+    Collect the combination ids referenced by a product's associations.
+    """
+    return [
+        combination["id"]
+        for combination in get_association(product, "combinations", "combination")
+    ]
 
 
-def get_combination(id: int):
-    return prestashop.get("combinations", id)
+def get_combinations(ids, chunk_size: int = COMBINATIONS_CHUNK_SIZE):
+    """
+    Fetch combinations in chunks using filter[id]=[a|b|c] and display=full.
+
+    Args:
+        ids (iterable): Combination ids, duplicates are ignored.
+        chunk_size (int): Number of ids per request.
+
+    Returns:
+        dict: Combination payloads indexed by their id (as string).
+    """
+    ids = list(dict.fromkeys(str(id) for id in ids))
+    combinations = {}
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start : start + chunk_size]
+        response = ps_get(
+            "combinations",
+            options={"display": "full", "filter[id]": f"[{'|'.join(chunk)}]"},
+        )
+        if not response.get("combinations"):
+            continue
+        for combination in as_list(response["combinations"]["combination"]):
+            combinations[str(combination["id"])] = combination
+
+    return combinations
 
 
 def get_feature(id: int):
-    return prestashop.get("product_features", id)
+    return ps_get("product_features", id)
 
 
 def get_feature_value(id: int):
-    return prestashop.get("product_feature_values", id)
+    return ps_get("product_feature_values", id)
 
 
 def get_product_option_values(id: int):
-    return prestashop.get("product_option_values", id)
+    return ps_get("product_option_values", id)
 
 
 def get_product_option(id: int):
     try:
-        return prestashop.get("product_options", id)
+        return ps_get("product_options", id)
     except PrestaShopWebServiceError as e:
+        # Retries are exhausted at this point, never drop variants because of overload
+        if is_transient(e):
+            raise
         return None
 
 
+def list_product_option_values(limit: int = 99999):
+    return ps_get(
+        "product_option_values",
+        options={"display": "full", "limit": limit},
+    )
+
+
+def list_product_options(limit: int = 999):
+    return ps_get(
+        "product_options",
+        options={"display": "full", "limit": limit},
+    )
+
+
 def get_manufacturer(id: int):
     try:
-        return prestashop.get("manufacturers", id)
+        return ps_get("manufacturers", id)
     except PrestaShopWebServiceError as e:
+        if is_transient(e):
+            raise
         print(f"Error getting manufacturer {id}: {e}")
         return None
 
 
+def list_manufacturers(limit: int = 999):
+    return ps_get(
+        "manufacturers",
+        options={"display": "full", "limit": limit},
+    )
+
+
 def get_manufacturer_name(id: int):
     if isinstance(id, str):
         id = int(id)
@@ -111,7 +381,14 @@ def get_manufacturer_name(id: int):
 
 
 def get_supplier(id: int):
-    return prestashop.get("suppliers", id)
+    return ps_get("suppliers", id)
+
+
+def list_suppliers(limit: int = 999):
+    return ps_get(
+        "suppliers",
+        options={"display": "full", "limit": limit},
+    )
 
 
 def get_supplier_name(id: int):
@@ -125,10 +402,92 @@ def get_supplier_name(id: int):
     return supplier["supplier"]["name"]
 
 
+def get_image_url(image_id):
+    return f"{PS_SHOP_URL}//img/p/{'/'.join(str(image_id))}/{image_id}.jpg"
+
+
+def product_image_ids(product):
+    """
+    Image ids from the product's associations.images, which is part of a
+    display=full product.
+
+    Returns:
+        list: The image ids, or None if the payload has no images association.
+    """
+    if "images" not in product["associations"]:
+        return None
+    images = product["associations"]["images"]
+    images = as_list(images.get("image")) if isinstance(images, dict) else []
+    return [image["id"] for image in images]
+
+
+def needs_image_legends(product, alt_product_name: bool = None):
+    """
+    Whether building the image payloads of a product requests the images
+    endpoint: for the legends of a product with images, or as the fallback
+    when the images association is missing.
+    """
+    if alt_product_name is None:
+        alt_product_name = IMAGE_ALT_PRODUCT_NAME
+    image_ids = product_image_ids(product)
+    return image_ids is None or (bool(image_ids) and not alt_product_name)
+
+
+def get_product_images(product, alt_product_name: bool = None):
+    """
+    Build image payloads from the product's associations.images. The alt text
+    is the PrestaShop legend, which costs one images request per product with
+    images; ps_async issues those concurrently for a whole page and they are
+    memoized. The images endpoint is also the fallback when the association is
+    missing.
+
+    Args:
+        product (dict): A display=full product.
+        alt_product_name (bool): Use the product name as alt text instead of the
+            legend, which saves the images request. Defaults to
+            IMAGE_ALT_PRODUCT_NAME.
+
+    Returns:
+        list: Dicts with "url" and "alt", or None if the product has no images.
+    """
+    if alt_product_name is None:
+        alt_product_name = IMAGE_ALT_PRODUCT_NAME
+
+    image_ids = product_image_ids(product)
+    if image_ids is None:
+        return get_product_image(product["id"])
+    if not image_ids:
+        return None
+
+    image_urls = [get_image_url(image_id) for image_id in image_ids]
+    if alt_product_name:
+        alt = product["name"]["language"]["value"]
+        return [{"url": url, "alt": alt} for url in image_urls]
+
+    legends = {
+        image_data["url"]: image_data["alt"]
+        for image_data in get_product_image(product["id"]) or []
+    }
+    return [{"url": url, "alt": legends.get(url, "")} for url in image_urls]
+
+
+_image_cache = {}
+
+
 def get_product_image(id: int):
+    if id in _image_cache:
+        return _image_cache[id]
+    image_data = _get_product_image(id)
+    _image_cache[id] = image_data
+    return image_data
+
+
+def _get_product_image(id: int):
     try:
-        images = prestashop.get("images/products", id)
+        images = ps_get("images/products", id)
     except PrestaShopWebServiceError as e:
+        if is_transient(e):
+            raise
         return None
     # Check if declination is a list or a dictionary
     declinations = images["image"]["declination"]
@@ -138,7 +497,7 @@ def get_product_image(id: int):
 
     image_data = [
         {
-            "url": f"https://induclean.dk//img/p/{'/'.join(list(image['attrs']['id']))}/{image['attrs']['id']}.jpg",
+            "url": get_image_url(image["attrs"]["id"]),
             "alt": (
                 image["legend"]["language"]["value"]
                 if "legend" in image and "language" in image["legend"]
@@ -153,13 +512,13 @@ def get_product_image(id: int):
 
 def get_categories(id: int = None, limit: int = 100):
     if id is None and limit > 1:
-        return prestashop.get(
+        return ps_get(
             "categories",
             id,
             options={"display": "full", "filter[active]": "[1]", "limit": limit},
         )
     if id:
-        return prestashop.get("categories", id)
+        return ps_get("categories", id)
 
     raise Exception(
         "get_categories method requires either an id or a limit greater than 1"
@@ -168,31 +527,47 @@ def get_categories(id: int = None, limit: int = 100):
 
 _category_cache = {}
 
+
 def get_category(id: int):
     if id in _category_cache:
         return _category_cache[id]
-    category = prestashop.get("categories", id)
+    category = ps_get("categories", id)
     _category_cache[id] = category
     return category
 
 
 def get_features(id: int = None, limit: int = 999):
     if id is None and limit > 1:
-        return prestashop.get(
+        return ps_get(
             "product_features",
             id,
             options={"display": "full", "limit": limit},
         )
     if id:
-        return prestashop.get("product_features", id)
+        return ps_get("product_features", id)
 
     raise Exception(
         "get_categories method requires either an id or a limit greater than 1"
     )
 
 
+def get_feature_values(id: int = None, limit: int = 99999):
+    if id is None and limit > 1:
+        return ps_get(
+            "product_feature_values",
+            id,
+            options={"display": "full", "limit": limit},
+        )
+    if id:
+        return ps_get("product_feature_values", id)
+
+    raise Exception(
+        "get_feature_values method requires either an id or a limit greater than 1"
+    )
+
+
 def get_stock(id: int):
-    stock = prestashop.get("stock_availables", id)
+    stock = ps_get("stock_availables", id)
 
     try:
         stock_available = int(stock["stock_available"]["quantity"])
@@ -200,3 +575,40 @@ def get_stock(id: int):
         stock_available = 0
 
     return stock_available
+
+
+STOCK_CHUNK_SIZE = 50
+
+
+def get_stock_index(product_ids, chunk_size: int = STOCK_CHUNK_SIZE):
+    """
+    Bulk-fetch stock_availables for a batch of products.
+
+    Args:
+        product_ids (iterable): Product ids, duplicates are ignored.
+        chunk_size (int): Number of product ids per request.
+
+    Returns:
+        dict: Quantities indexed by (id_product, id_product_attribute) as strings.
+            Simple products use "0" as id_product_attribute.
+    """
+    product_ids = list(dict.fromkeys(str(id) for id in product_ids))
+    stock_index = {}
+
+    for start in range(0, len(product_ids), chunk_size):
+        chunk = product_ids[start : start + chunk_size]
+        response = ps_get(
+            "stock_availables",
+            options={"display": "full", "filter[id_product]": f"[{'|'.join(chunk)}]"},
+        )
+        if not response.get("stock_availables"):
+            continue
+        for stock in as_list(response["stock_availables"]["stock_available"]):
+            try:
+                quantity = int(stock["quantity"])
+            except Exception:
+                quantity = 0
+            key = (str(stock["id_product"]), str(stock["id_product_attribute"]))
+            stock_index[key] = quantity
+
+    return stock_index
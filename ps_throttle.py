@@ -0,0 +1,166 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from prestapyt import PrestaShopAuthenticationError, PrestaShopWebServiceError
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Requests per second allowed by the token bucket, 0 disables it
+RATE_LIMIT = float(os.environ.get("PS_RATE_LIMIT", 20))
+RATE_BURST = int(os.environ.get("PS_RATE_BURST", 10))
+# Bounds for the adaptive number of requests in flight
+MIN_CONCURRENCY = int(os.environ.get("PS_MIN_CONCURRENCY", 1))
+MAX_CONCURRENCY = int(os.environ.get("PS_MAX_CONCURRENCY", 8))
+MAX_RETRIES = int(os.environ.get("PS_MAX_RETRIES", 5))
+BACKOFF_BASE = float(os.environ.get("PS_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(os.environ.get("PS_BACKOFF_MAX", 30))
+
+# Status codes that mean "slow down / try again later"
+TRANSIENT_STATUS_CODES = {429, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+class TransientHTTPError(Exception):
+    """
+    Raised for storefront responses with a transient status code.
+    """
+
+    def __init__(self, url, status_code):
+        super().__init__(f"{url} returned {status_code}")
+        self.error_code = status_code
+
+
+def is_transient(error):
+    """
+    Whether an error is worth retrying, as opposed to e.g. a 404 for a missing resource.
+    """
+    if isinstance(error, PrestaShopAuthenticationError):
+        return False
+    if isinstance(error, (PrestaShopWebServiceError, TransientHTTPError)):
+        return error.error_code in TRANSIENT_STATUS_CODES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def is_throttled(error):
+    return getattr(error, "error_code", None) in THROTTLE_STATUS_CODES
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, at most `capacity` saved up.
+    """
+
+    def __init__(self, rate: float = RATE_LIMIT, capacity: int = RATE_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by one per `limit` successful requests and is
+    halved whenever the server signals overload.
+    """
+
+    def __init__(
+        self,
+        initial: int = MAX_CONCURRENCY,
+        minimum: int = MIN_CONCURRENCY,
+        maximum: int = MAX_CONCURRENCY,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class Throttle:
+    """
+    Client-side throttling for webservice calls: token bucket rate limit,
+    adaptive concurrency and retries with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket = None,
+        limiter: AdaptiveLimiter = None,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.bucket = bucket or TokenBucket()
+        self.limiter = limiter or AdaptiveLimiter()
+        self.max_retries = max_retries
+        self.retries = 0
+        self.throttled = 0
+
+    def backoff(self, attempt: int):
+        # "Full jitter" exponential backoff
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.limiter.acquire()
+            throttled = False
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttled(e)
+                if not is_transient(e) or attempt >= self.max_retries:
+                    raise
+            finally:
+                self.limiter.release(throttled)
+
+            if throttled:
+                self.throttled += 1
+            self.retries += 1
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def print_stats(self):
+        print(
+            f"Throttle: {self.retries} retries, {self.throttled} throttled responses, "
+            f"concurrency limit {self.limiter.limit:.1f}"
+        )
+
+
+throttle = Throttle()
@@ -0,0 +1,117 @@
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Transport settings, overridable from the .env file
+HTTP_POOL_SIZE = int(os.environ.get("PS_HTTP_POOL_SIZE", 10))
+HTTP_KEEP_ALIVE = os.environ.get("PS_HTTP_KEEP_ALIVE", "1") != "0"
+HTTP_COMPRESSION = os.environ.get("PS_HTTP_COMPRESSION", "1") != "0"
+HTTP_TIMEOUT = float(os.environ.get("PS_HTTP_TIMEOUT", 60))
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with a default timeout, since neither prestapyt nor the
+    URL lookups pass one themselves.
+    """
+
+    def __init__(self, timeout=HTTP_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session(
+    pool_size: int = HTTP_POOL_SIZE,
+    keep_alive: bool = HTTP_KEEP_ALIVE,
+    compression: bool = HTTP_COMPRESSION,
+    timeout: float = HTTP_TIMEOUT,
+):
+    """
+    Create a requests.Session backed by a pooled urllib3 connection pool.
+
+    Args:
+        pool_size (int): Maximum number of connections kept open per host.
+        keep_alive (bool): Reuse connections between requests.
+        compression (bool): Ask the server for gzip/deflate encoded responses.
+        timeout (float): Default timeout in seconds for every request.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(
+        timeout=timeout,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        pool_block=False,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    session.headers["Connection"] = "keep-alive" if keep_alive else "close"
+    session.headers["Accept-Encoding"] = "gzip, deflate" if compression else "identity"
+
+    return session
+
+
+# Separate sessions: prestapyt sets the webservice key as basic auth on the
+# session it is given, which must not be sent along with storefront lookups
+api_session = create_session()
+storefront_session = create_session()
+
+
+def connection_stats(http_sessions=None):
+    """
+    Report how often connections in the sessions' pools have been reused.
+
+    Args:
+        http_sessions (list): Sessions to report on, both shared sessions by default.
+
+    Returns:
+        dict: Number of requests, new connections, reused connections and the reuse ratio.
+    """
+    http_sessions = http_sessions or [api_session, storefront_session]
+    requests_count = 0
+    connections_count = 0
+
+    adapters = {
+        adapter
+        for http_session in http_sessions
+        for adapter in http_session.adapters.values()
+    }
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_count += pool.num_requests
+            connections_count += pool.num_connections
+
+    reused = max(requests_count - connections_count, 0)
+
+    return {
+        "requests": requests_count,
+        "connections": connections_count,
+        "reused": reused,
+        "reuse_ratio": reused / requests_count if requests_count else 0.0,
+    }
+
+
+def print_connection_stats(http_sessions=None):
+    stats = connection_stats(http_sessions)
+    print(
+        f"HTTP requests: {stats['requests']}, "
+        f"connections opened: {stats['connections']}, "
+        f"reused: {stats['reused']} ({stats['reuse_ratio']:.0%})"
+    )
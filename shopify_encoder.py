@@ -0,0 +1,131 @@
+import dataclasses
+import json
+import typing
+
+from dataclasses_json.core import _asdict
+
+from shopify_types import CompactMixin, ExcludeNullMixin
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Exclude predicate of ExcludeNullMixin, compiled to an inline `is not None` check
+_EXCLUDE_NULL = ExcludeNullMixin.dataclass_json_config["exclude"]
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+_encoders = {}
+
+
+def _unwrap_optional(annotation):
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _value_expression(annotation, name: str, namespace: dict):
+    """
+    Python expression that encodes the value held in variable `name`.
+
+    The annotation only selects the fast path; values of another type (e.g. a
+    str in a MoneyV2 field) fall back to encode_value.
+    """
+    namespace["encode_value"] = encode_value
+    annotation = _unwrap_optional(annotation)
+    if dataclasses.is_dataclass(annotation):
+        encoder_name = f"encode_{annotation.__name__}"
+        class_name = f"class_{annotation.__name__}"
+        namespace[encoder_name] = compile_encoder(annotation)
+        namespace[class_name] = annotation
+        return (
+            f"{encoder_name}({name}) if {name}.__class__ is {class_name} "
+            f"else encode_value({name})"
+        )
+    if typing.get_origin(annotation) in (list, typing.List):
+        (item_annotation,) = typing.get_args(annotation)
+        item = _value_expression(item_annotation, "item", namespace)
+        return (
+            f"[{item} for item in {name}] if {name}.__class__ is list "
+            f"else encode_value({name})"
+        )
+    if annotation in _SCALARS:
+        namespace["_SCALARS"] = _SCALARS
+        return f"{name} if {name}.__class__ in _SCALARS else encode_value({name})"
+    return f"encode_value({name})"
+
+
+def compile_encoder(cls):
+    """
+    Generate a function that turns an instance of cls into the same dict as
+    cls.to_dict(), with the letter case and exclude settings resolved once.
+    """
+    if cls in _encoders:
+        return _encoders[cls]
+
+    config = getattr(cls, "dataclass_json_config", None) or {}
+    hints = typing.get_type_hints(cls)
+    namespace = {}
+    lines = [f"def encode_{cls.__name__}(obj):", "    d = {}"]
+    for index, field in enumerate(dataclasses.fields(cls)):
+        field_config = dict(config)
+        field_config.update(field.metadata.get("dataclasses_json", {}))
+        letter_case = field_config.get("letter_case")
+        exclude = field_config.get("exclude")
+        key = letter_case(field.name) if letter_case is not None else field.name
+        value = _value_expression(hints[field.name], "v", namespace)
+
+        lines.append(f"    v = obj.{field.name}")
+        if exclude is _EXCLUDE_NULL:
+            lines.append("    if v is not None:")
+        elif exclude is not None:
+            namespace[f"exclude_{index}"] = exclude
+            lines.append(f"    if not exclude_{index}(v):")
+        else:
+            lines.append("    if True:")
+        lines.append(f"        d[{key!r}] = {value}")
+    lines.append("    return d")
+
+    exec("\n".join(lines), namespace)
+    encoder = namespace[f"encode_{cls.__name__}"]
+    _encoders[cls] = encoder
+    return encoder
+
+
+def encode_value(value):
+    """
+    Encode any value the way dataclasses_json does, using the compiled encoders
+    for dataclasses.
+    """
+    if value.__class__ in _SCALARS:
+        return value
+    encoder = _encoders.get(value.__class__)
+    if encoder is not None:
+        return encoder(value)
+    if dataclasses.is_dataclass(value) and isinstance(
+        value, (ExcludeNullMixin, CompactMixin)
+    ):
+        return compile_encoder(type(value))(value)
+    if isinstance(value, list):
+        return [encode_value(item) for item in value]
+    return _asdict(value)
+
+
+def encode(obj):
+    """
+    Fast replacement for obj.to_dict() on the shopify_types dataclasses.
+    """
+    return compile_encoder(type(obj))(obj)
+
+
+def dumps(obj):
+    """
+    Serialize a shopify_types dataclass to JSON bytes, with orjson if installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(encode(obj))
+    return json.dumps(encode(obj), ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
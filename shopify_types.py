@@ -1,3 +1,4 @@
+import sys
 from dataclasses import dataclass
 from dataclasses_json import (
     dataclass_json,
@@ -86,6 +87,7 @@ class CreateShopifyProductVariantInput(ExcludeNullMixin):
     price: MoneyV2
     inventoryQuantities: List[InventoryQuantity]
     optionValues: List[VariantOptionValue]
+    metafields: Optional[List["ShopifyMetaField"]] = None
 
 
 @dataclass_json
@@ -189,3 +191,54 @@ class ProductSet(ExcludeNullMixin):
     productOptions: Optional[List[ProductOptionValue]] = None
     collections: Optional[List[CreateCollectionInput]] = None
     brand: Optional[CreateBrandInput] = None
+
+
+class CompactMixin:
+    """
+    Base of the compact variants below. Same JSON config as ExcludeNullMixin,
+    but without a __dict__ per instance.
+    """
+
+    __slots__ = ()
+    dataclass_json_config = ExcludeNullMixin.dataclass_json_config
+
+    def _intern(self, *names):
+        # Frozen instances can only be changed through object.__setattr__
+        for name in names:
+            value = getattr(self, name)
+            if isinstance(value, str):
+                object.__setattr__(self, name, sys.intern(value))
+
+
+@dataclass_json
+@dataclass(slots=True, frozen=True)
+class CompactShopifyMetaField(CompactMixin):
+    namespace: str
+    key: str
+    value: str
+    type: str
+
+    def __post_init__(self):
+        # value is mostly unique per product, so it is not interned
+        self._intern("namespace", "key", "type")
+
+
+@dataclass_json
+@dataclass(slots=True, frozen=True)
+class CompactInventoryQuantity(CompactMixin):
+    locationId: str
+    name: str
+    quantity: int
+
+    def __post_init__(self):
+        self._intern("locationId", "name")
+
+
+@dataclass_json
+@dataclass(slots=True, frozen=True)
+class CompactVariantOptionValue(CompactMixin):
+    name: str
+    optionName: str
+
+    def __post_init__(self):
+        self._intern("name", "optionName")
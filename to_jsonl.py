@@ -1,6 +1,29 @@
 import json
 import os
 
+OUTPUT_PATH = os.path.join("dump", "shopify_products.jsonl")
+
+
+def write_jsonl(products, path: str = OUTPUT_PATH):
+    """
+    Write products as Shopify bulk operation input, one {"input": product} per line.
+
+    The file is written under a temporary name and moved into place when done,
+    so products can be streamed in without leaving a partial file behind.
+
+    Returns:
+        int: Number of products written.
+    """
+    count = 0
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for item in products:
+            # Dump each item as a single line JSON object
+            json.dump({"input": item}, f, ensure_ascii=False)
+            f.write("\n")  # Write each JSON object on a new line
+            count += 1
+    os.replace(path + ".tmp", path)
+    return count
+
 
 def convert_to_jsonl(path):
     # Ensure the output directory exists
@@ -14,13 +37,7 @@ def convert_to_jsonl(path):
             )  # Assuming the JSON file contains a list or other iterable structure
 
         # Step 2: Dump the data as JSONL to the output file
-        with open(
-            os.path.join("dump", "shopify_products.jsonl"), "w", encoding="utf-8"
-        ) as f:
-            for item in data:
-                # Dump each item as a single line JSON object
-                json.dump({"input": item}, f, ensure_ascii=False)
-                f.write("\n")  # Write each JSON object on a new line
+        write_jsonl(data)
 
         print("JSONL file created successfully.")
     except Exception as e:
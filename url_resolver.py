@@ -0,0 +1,93 @@
+import os
+from urllib.parse import urljoin
+
+from dotenv import load_dotenv
+
+from ps_cache import response_cache
+from ps_services import PS_SHOP_URL, get_category
+from ps_throttle import TransientHTTPError, TRANSIENT_STATUS_CODES, throttle
+from ps_transport import storefront_session
+
+load_dotenv()
+
+# Build canonical URLs from link_rewrite instead of asking the shop.
+# Only enable this when the patterns below match the shop's SEO route settings.
+BUILD_URLS_LOCALLY = os.environ.get("PS_BUILD_URLS_LOCALLY", "0") == "1"
+PRODUCT_URL_PATTERN = "{shop}/{category}/{id}-{rewrite}.html"
+CATEGORY_URL_PATTERN = "{shop}/{id}-{rewrite}"
+
+MAX_REDIRECTS = 10
+REDIRECT_STATUS_CODES = {301, 302, 303, 307, 308}
+
+# Resolved URLs are stored in the persistent response cache under this resource
+URL_CACHE_RESOURCE = "urls"
+
+_url_cache = {}
+
+
+def _follow_redirects(url: str):
+    """
+    Follow redirects with HEAD requests, reading only the Location header.
+    """
+    for _ in range(MAX_REDIRECTS):
+        response = storefront_session.head(url, allow_redirects=False)
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise TransientHTTPError(url, response.status_code)
+        if response.status_code == 405:
+            # HEAD not allowed, fall back to GET without downloading the body
+            with storefront_session.get(url, stream=True) as response:
+                if response.status_code in TRANSIENT_STATUS_CODES:
+                    raise TransientHTTPError(url, response.status_code)
+                return response.url
+        location = response.headers.get("Location")
+        if response.status_code not in REDIRECT_STATUS_CODES or not location:
+            return url
+        url = urljoin(url, location)
+    return url
+
+
+def resolve_url(url: str):
+    """
+    Return the URL a storefront URL finally redirects to.
+    Results are cached in memory and in the persistent response cache.
+    """
+    if url in _url_cache:
+        return _url_cache[url]
+
+    resolved_url = response_cache.get(URL_CACHE_RESOURCE, url)
+    if resolved_url is None:
+        resolved_url = throttle.call(_follow_redirects, url)
+        response_cache.set(URL_CACHE_RESOURCE, url, None, resolved_url)
+
+    _url_cache[url] = resolved_url
+    return resolved_url
+
+
+def product_url(product):
+    """
+    Canonical storefront URL of a product payload.
+    """
+    if BUILD_URLS_LOCALLY:
+        category = get_category(product["id_category_default"])["category"]
+        return PRODUCT_URL_PATTERN.format(
+            shop=PS_SHOP_URL,
+            category=category["link_rewrite"]["language"]["value"],
+            id=product["id"],
+            rewrite=product["link_rewrite"]["language"]["value"],
+        )
+    # Ps will automatically redirect to the canonical url
+    return resolve_url(f"{PS_SHOP_URL}/random/{product['id']}-random.html")
+
+
+def category_url(category):
+    """
+    Canonical storefront URL of a category payload.
+    """
+    if BUILD_URLS_LOCALLY:
+        return CATEGORY_URL_PATTERN.format(
+            shop=PS_SHOP_URL,
+            id=category["id"],
+            rewrite=category["link_rewrite"]["language"]["value"],
+        )
+    # Ps will automatically redirect to the canonical url
+    return resolve_url(f"{PS_SHOP_URL}/{category['id']}-random")